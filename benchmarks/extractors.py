@@ -0,0 +1,80 @@
+"""
+Pages parsed per second by the price extractors over recorded HTML pages.
+
+Fixtures are `<shortname>_<anything>.html` files, each parsed with the
+extractor registered for `<shortname>` (the generic one for `default`).
+Every fixture is also parsed as a whole document with lxml for reference,
+and all of them through a process pool like the crawler does.
+
+    python benchmarks/extractors.py --fixtures benchmarks/fixtures --seconds 2 --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import lxml.html
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'price_tracker'))
+
+from products.extractors import autodiscover, extract_price, get_extractor  # noqa: E402
+
+
+def rate(function, seconds):
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def load_fixtures(directory):
+    fixtures = []
+    for path in sorted(Path(directory).glob('*.html')):
+        shortname = path.stem.split('_', 1)[0]
+        fixtures.append((path.name, shortname, path.read_text(encoding='utf-8')))
+    return fixtures
+
+
+def pool_rate(fixtures, workers, seconds):
+    pages = [(shortname, html) for _, shortname, html in fixtures]
+    batch = pages * 50
+    with ProcessPoolExecutor(workers, initializer=autodiscover) as pool:
+        list(pool.map(extract_price, *zip(*pages)))  # start the workers
+        parsed = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            parsed += len(list(pool.map(extract_price, *zip(*batch), chunksize=8)))
+        return parsed / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=Path(__file__).resolve().parent / 'fixtures')
+    parser.add_argument('--seconds', type=float, default=1, help='Time spent on each measurement.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes of the pool.')
+    args = parser.parse_args()
+
+    autodiscover()
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        parser.error(f'no fixtures in {args.fixtures}')
+
+    print(f'{"fixture":32} {"extractor":18} {"price":>10} {"pages/s":>10} {"lxml full pages/s":>18}')
+    for name, shortname, html in fixtures:
+        extractor = get_extractor(shortname)
+        price = extractor.extract(html)
+        pages = rate(lambda: extractor.extract(html), args.seconds)
+        full = rate(lambda: lxml.html.document_fromstring(html), args.seconds)
+        print(f'{name:32} {type(extractor).__name__:18} {price!s:>10} {pages:10.0f} {full:18.0f}')
+
+    print(f'\nprocess pool, {args.workers} workers: {pool_rate(fixtures, args.workers, args.seconds):.0f} pages/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Local mock store to exercise the crawler.
+
+Serves `/product/<n>` pages with a JSON-LD price, an ETag and a
+Last-Modified header, answers conditional requests with 304 and counts the
+requests it receives. `/stats` returns the counters as JSON, including the
+highest number of requests seen within one second and the user agents.
+
+    python benchmarks/mock_store.py --port 8099 --change-every 60
+
+Point a store's base_url and its products' links at it, e.g.
+`http://127.0.0.1:8099/product/1`, and run `manage.py crawl`.
+"""
+import argparse
+import collections
+import hashlib
+import json
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PAGE = """<html><head><title>Product {number}</title>
+<script type="application/ld+json">{{"@type": "Product", "sku": "{number}", "offers": {{"price": "{price:.2f}"}}}}</script>
+</head><body><h1>Product {number}</h1></body></html>"""
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.per_second = collections.Counter()
+        self.user_agents = collections.Counter()
+
+    def add(self, user_agent, status):
+        with self.lock:
+            self.requests += 1
+            self.not_modified += status == 304
+            self.per_second[int(time.time())] += 1
+            self.user_agents[user_agent] += 1
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'not_modified': self.not_modified,
+                'max_per_second': max(self.per_second.values(), default=0),
+                'user_agents': dict(self.user_agents),
+            }
+
+
+def make_handler(stats, change_every, started):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def send(self, status, body=b'', headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                return self.send(200, json.dumps(stats.as_dict()).encode(), {'Content-Type': 'application/json'})
+            parts = self.path.strip('/').split('/')
+            if len(parts) != 2 or parts[0] != 'product' or not parts[1].isdigit():
+                stats.add(self.headers.get('User-Agent'), 404)
+                return self.send(404)
+
+            number = int(parts[1])
+            # The price changes every `change_every` seconds (never with 0).
+            version = int((time.time() - started) // change_every) if change_every else 0
+            price = 100 + (number * 7 + version * 13) % 50
+            body = PAGE.format(number=number, price=price).encode()
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            modified = formatdate(started + version * change_every, usegmt=True)
+            headers = {'ETag': etag, 'Last-Modified': modified}
+
+            if self.headers.get('If-None-Match') == etag:
+                stats.add(self.headers.get('User-Agent'), 304)
+                return self.send(304, headers=headers)
+            stats.add(self.headers.get('User-Agent'), 200)
+            self.send(200, body, {**headers, 'Content-Type': 'text/html; charset=utf-8'})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--change-every', type=float, default=0, help='Seconds between price changes (0: never).')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(Stats(), args.change_every, time.time()))
+    print(f'Mock store on http://{args.host}:{args.port}/product/<n>')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
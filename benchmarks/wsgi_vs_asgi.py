@@ -0,0 +1,129 @@
+"""
+Throughput of the WSGI (gunicorn, sync views) and ASGI (uvicorn, async
+views) deployments under concurrent load.
+
+Both servers are started against the database configured by the DJ_*
+environment variables, with the page cache disabled so every request runs
+its queries. Each path is requested by `--concurrency` clients for
+`--duration` seconds; with `--delay` every client pauses between its
+requests, like slow clients keeping connections open.
+
+    python benchmarks/wsgi_vs_asgi.py --paths /product/ /product/1 --concurrency 200
+
+gunicorn is only needed for this benchmark (`pip install gunicorn`).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent / 'price_tracker'
+
+SERVERS = {
+    'wsgi': lambda args: [
+        sys.executable, '-m', 'gunicorn', 'price_tracker.wsgi:application',
+        '--bind', f'127.0.0.1:{args.port}', '--workers', str(args.workers),
+        '--threads', str(args.threads), '--log-level', 'warning',
+    ],
+    'asgi': lambda args: [
+        sys.executable, '-m', 'uvicorn', 'price_tracker.asgi:application',
+        '--host', '127.0.0.1', '--port', str(args.port), '--workers', str(args.workers),
+        '--log-level', 'warning',
+    ],
+}
+
+
+def start_server(kind, args):
+    env = {
+        **os.environ,
+        'DJ_CACHE_DISABLED': '1',
+        'DJ_ASYNC_VIEWS': '1' if kind == 'asgi' else '0',
+    }
+    return subprocess.Popen(SERVERS[kind](args), cwd=PROJECT_DIR, env=env)
+
+
+async def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f'{url} did not start')
+
+
+async def load(url, concurrency, duration, delay):
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def client_loop(client):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                if response.status_code != 200:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+            if delay:
+                await asyncio.sleep(delay)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else (values or [0])[0]
+
+
+async def run(args):
+    print(f'{"server":6} {"path":30} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"errors":>7}')
+    for kind in args.servers:
+        server = start_server(kind, args)
+        try:
+            base = f'http://127.0.0.1:{args.port}'
+            await wait_ready(base + args.paths[0])
+            for path in args.paths:
+                await load(base + path, min(args.concurrency, 10), 1, 0)  # warm up
+                latencies, errors, elapsed = await load(base + path, args.concurrency, args.duration, args.delay)
+                print(
+                    f'{kind:6} {path:30} {len(latencies) / elapsed:9.1f} '
+                    f'{percentile(latencies, 50) * 1000:8.1f} {percentile(latencies, 95) * 1000:8.1f} {errors:7}'
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paths', nargs='+', default=['/product/'])
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--delay', type=float, default=0, help='Pause between requests of a client (s).')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker.')
+    parser.add_argument('--port', type=int, default=8765)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,6 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.sites.shortcuts import get_current_site
-from django.core.mail import EmailMultiAlternatives
 from django.template import loader
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
@@ -16,6 +15,8 @@ from django.contrib.auth.forms import (
     PasswordResetForm,
 )
 
+from .utils import queue_mail
+
 
 UserModel = get_user_model()
 attr_class_form = 'form-control h-auto form-control-solid'
@@ -109,7 +110,7 @@ class UserDeleteForm(LoginForm):
 
 class SendEmailMixin:
     """
-    Send a django.core.mail.EmailMultiAlternatives to `to_email`.
+    Queue an email to `to_email`, the `send_queued_mail` command sends it.
     """
     
     def send_mail(
@@ -126,12 +127,11 @@ class SendEmailMixin:
         subject = "".join(subject.splitlines())
         body = loader.render_to_string(email_template_name, context)
 
-        email_message = EmailMultiAlternatives(subject, body, from_email, [to_email])
+        html_email = ''
         if html_email_template_name is not None:
             html_email = loader.render_to_string(html_email_template_name, context)
-            email_message.attach_alternative(html_email, "text/html")
 
-        email_message.send()
+        queue_mail(subject, body, to_email, from_email=from_email, html_body=html_email)
 
 
 # register    
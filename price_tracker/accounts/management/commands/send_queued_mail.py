@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.utils import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = 'Send the pending emails of the outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Emails sent per SMTP connection.')
+        parser.add_argument('--max-attempts', type=int, help='Attempts before giving up on an email.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop (default: 5).')
+
+    def handle(self, *args, **options):
+        while True:
+            # Apply CONN_MAX_AGE and the health checks like between requests.
+            close_old_connections()
+            sent, failed = send_queued_mail(options['batch_size'], options['max_attempts'])
+            if sent or failed:
+                self.stdout.write(f'{sent} sent, {failed} failed')
+            if not options['loop']:
+                break
+            if not sent and not failed:
+                time.sleep(options['interval'])
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -7,3 +9,45 @@ class User(AbstractUser):
     
     def __str__(self) -> str:
         return self.username
+
+
+
+class QueuedEmail(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(verbose_name='Subject', max_length=255)
+    body = models.TextField(verbose_name='Body')
+    html_body = models.TextField(verbose_name='HTML Body', blank=True)
+    from_email = models.CharField(verbose_name='From', max_length=254, blank=True)
+    to_email = models.EmailField(verbose_name='To')
+    status = models.CharField(verbose_name='Status', max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(verbose_name='Attempts', default=0)
+    next_attempt_at = models.DateTimeField(verbose_name='Next Attempt', default=timezone.now)
+    last_error = models.TextField(verbose_name='Last Error', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Date Created')
+    sent_at = models.DateTimeField(verbose_name='Date Sent', blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='queuedemail_pending',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.to_email}: {self.subject}'
+
+    def message(self):
+        message = EmailMultiAlternatives(self.subject, self.body, self.from_email or None, [self.to_email])
+        if self.html_body:
+            message.attach_alternative(self.html_body, "text/html")
+        return message
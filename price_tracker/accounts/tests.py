@@ -1,3 +1,138 @@
-from django.test import TestCase
+import datetime
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
 
-# Create your tests here.
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import QueuedEmail
+from .utils import claim_queued_mail, queue_mail, send_queued_mail
+
+
+REJECTED = 'rejected@example.com'
+
+
+class RejectingBackend(EmailBackend):
+    """
+    locmem backend that refuses `REJECTED`, and every message while
+    `down` is set. Drops the connection before the message number
+    `disconnect_at`.
+    """
+    down = False
+    opened = 0
+    disconnect_at = None
+
+    def open(self):
+        if RejectingBackend.down:
+            raise ConnectionRefusedError('SMTP server down')
+        RejectingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if len(mail.outbox) == RejectingBackend.disconnect_at:
+            RejectingBackend.disconnect_at = None
+            raise SMTPServerDisconnected('Connection unexpectedly closed')
+        for message in messages:
+            if REJECTED in message.to:
+                raise SMTPRecipientsRefused({REJECTED: (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='accounts.tests.RejectingBackend',
+    EMAIL_QUEUE_BATCH_SIZE=10,
+    EMAIL_QUEUE_MAX_ATTEMPTS=3,
+    EMAIL_QUEUE_BACKOFF=60,
+)
+class SendQueuedMailTests(TestCase):
+
+    def setUp(self):
+        RejectingBackend.down = False
+        RejectingBackend.opened = 0
+        RejectingBackend.disconnect_at = None
+
+    def make_due(self):
+        QueuedEmail.objects.update(next_attempt_at=timezone.now())
+
+    def test_sends_batch_over_one_connection(self):
+        for i in range(3):
+            queue_mail('Hola', 'Cuerpo', f'user{i}@example.com', html_body='<p>Cuerpo</p>')
+        self.assertEqual(send_queued_mail(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(RejectingBackend.opened, 1)
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>Cuerpo</p>', 'text/html')])
+        self.assertFalse(QueuedEmail.objects.exclude(status=QueuedEmail.SENT).exists())
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+    def test_batch_size(self):
+        for i in range(3):
+            queue_mail('Hola', 'Cuerpo', f'user{i}@example.com')
+        self.assertEqual(send_queued_mail(batch_size=2), (2, 0))
+        self.assertEqual(send_queued_mail(batch_size=2), (1, 0))
+
+    def test_rejected_recipient_only_fails_its_email(self):
+        queue_mail('Hola', 'Cuerpo', 'user@example.com')
+        email = queue_mail('Hola', 'Cuerpo', REJECTED)
+        self.assertEqual(send_queued_mail(), (1, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.PENDING)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('No such user', email.last_error)
+
+    def test_exponential_backoff(self):
+        email = queue_mail('Hola', 'Cuerpo', REJECTED)
+        for attempt, delay in [(1, 60), (2, 120)]:
+            before = timezone.now()
+            self.assertEqual(send_queued_mail(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, attempt)
+            self.assertGreaterEqual(email.next_attempt_at, before + datetime.timedelta(seconds=delay))
+            self.assertLess(email.next_attempt_at, timezone.now() + datetime.timedelta(seconds=delay))
+            # Not retried before its next attempt.
+            self.assertEqual(send_queued_mail(), (0, 0))
+            self.make_due()
+
+    def test_gives_up_after_max_attempts(self):
+        email = queue_mail('Hola', 'Cuerpo', REJECTED)
+        for _ in range(3):
+            self.make_due()
+            send_queued_mail()
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.FAILED)
+        self.assertEqual(email.attempts, 3)
+        self.make_due()
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+    def test_connection_error_retries_the_batch(self):
+        for i in range(2):
+            queue_mail('Hola', 'Cuerpo', f'user{i}@example.com')
+        RejectingBackend.down = True
+        self.assertEqual(send_queued_mail(), (0, 2))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(QueuedEmail.objects.exclude(last_error='SMTP server down').exists())
+
+        RejectingBackend.down = False
+        self.make_due()
+        self.assertEqual(send_queued_mail(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_reconnects_when_server_disconnects(self):
+        for i in range(3):
+            queue_mail('Hola', 'Cuerpo', f'user{i}@example.com')
+        RejectingBackend.disconnect_at = 1
+        self.assertEqual(send_queued_mail(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(RejectingBackend.opened, 2)
+
+    def test_claimed_emails_are_not_sent_twice(self):
+        email = queue_mail('Hola', 'Cuerpo', 'user@example.com')
+        # A worker that claimed the email and died before sending it.
+        self.assertEqual(claim_queued_mail(10, 600), [email])
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+        self.make_due()
+        self.assertEqual(send_queued_mail(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(email.status, QueuedEmail.SENT)
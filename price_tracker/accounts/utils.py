@@ -1,9 +1,14 @@
+import datetime
+from smtplib import SMTPServerDisconnected
+
+from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
 
 
 from django.contrib import messages
+from django.db import transaction
 from django.template.loader import render_to_string
-from django.core.mail import EmailMessage
+from django.core.mail import get_connection
 
 from django import forms
 from django.contrib.auth.forms import PasswordResetForm
@@ -12,10 +17,13 @@ from django.contrib.auth.tokens import default_token_generator
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.mail import EmailMultiAlternatives
 from django.template import loader
+from django.utils import timezone
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.translation import gettext_lazy as _
 
+from .models import QueuedEmail
+
 UserModel = get_user_model()
 
 
@@ -53,12 +61,113 @@ def send_activation_email(request, user, to_email):
         }
     )
     
-    email = EmailMessage(subject, message, to=[to_email])
-    
-    if email.send():
+    if queue_mail(subject, message, to_email):
         messages.success(request, f'Para completar tu registro, verifica tu correo electrónico <b>{to_email}</b>')
         messages.success(request, f'Revisa tu bandeja de entrada y sigue las instrucciones del correo que te enviamos. \
                                     Si no lo encuentras, revisa tu carpeta de spam.')
     else:
         messages.error(request, f'Hubo un error al enviar correo a <b>{to_email}</b>')
-    
\ No newline at end of file
+
+
+def queue_mail(subject, body, to_email, from_email=None, html_body=''):
+    """
+    Store an email in the outbox, `send_queued_mail()` delivers it later
+    outside of the request.
+    """
+    return QueuedEmail.objects.create(
+        subject=subject,
+        body=body,
+        html_body=html_body or '',
+        from_email=from_email or '',
+        to_email=to_email,
+    )
+
+
+def claim_queued_mail(batch_size, claim_seconds):
+    """
+    Take up to `batch_size` due emails for `claim_seconds`, counting the
+    attempt. Rows are locked with SKIP LOCKED only while they are claimed,
+    so several workers can run at the same time.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            QueuedEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=QueuedEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        for email in emails:
+            email.attempts += 1
+            email.next_attempt_at = now + datetime.timedelta(seconds=claim_seconds)
+        QueuedEmail.objects.bulk_update(emails, ['attempts', 'next_attempt_at'])
+    return emails
+
+
+def send_with_reconnect(connection, message):
+    """
+    Send one message on the open connection, so a rejected recipient only
+    fails its own email. Opens the connection again once if the server
+    dropped it.
+    """
+    try:
+        connection.send_messages([message])
+    except SMTPServerDisconnected:
+        connection.close()
+        connection.open()
+        connection.send_messages([message])
+
+
+def send_queued_mail(batch_size=None, max_attempts=None, backoff=None, claim_seconds=None):
+    """
+    Send up to `batch_size` pending emails over a single SMTP connection.
+
+    The emails are claimed first, then sent outside of any transaction and
+    saved one by one, so a crash only resends the email in flight once the
+    claim (`EMAIL_QUEUE_CLAIM_SECONDS`) expires. A dropped connection is
+    opened again. Failed emails are retried with an exponential backoff and
+    given up after `max_attempts`. Returns `(sent, failed)`.
+    """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    max_attempts = max_attempts or settings.EMAIL_QUEUE_MAX_ATTEMPTS
+    backoff = backoff or settings.EMAIL_QUEUE_BACKOFF
+    claim_seconds = claim_seconds or settings.EMAIL_QUEUE_CLAIM_SECONDS
+
+    emails = claim_queued_mail(batch_size, claim_seconds)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    error = None
+    try:
+        connection.open()
+    except Exception as exc:
+        connection, error = None, exc
+
+    for email in emails:
+        if connection is not None:
+            try:
+                send_with_reconnect(connection, email.message())
+            except Exception as exc:
+                error = exc
+            else:
+                error = None
+
+        if error is None:
+            email.status = QueuedEmail.SENT
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            sent += 1
+        else:
+            failed += 1
+            email.last_error = str(error)
+            if email.attempts >= max_attempts:
+                email.status = QueuedEmail.FAILED
+            else:
+                delay = backoff * 2 ** (email.attempts - 1)
+                email.next_attempt_at = timezone.now() + datetime.timedelta(seconds=delay)
+        email.save(update_fields=['status', 'next_attempt_at', 'last_error', 'sent_at'])
+
+    if connection is not None:
+        connection.close()
+    return sent, failed
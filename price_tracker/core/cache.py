@@ -0,0 +1,137 @@
+"""
+Page caching invalidated through version keys.
+
+Cached pages are stored under a key that includes the current value of one
+or more version keys. Bumping a version, e.g. after a crawl writes new
+prices, makes every page built from it unreachable, so pages can be cached
+for long and stale entries simply expire. Version keys live in the
+`versions` cache, so the writes of a busy ingestion do not evict pages (nor
+pages the versions). Pages stored under a version are
+rendered from the primary database: a lagging replica could miss the writes
+that bumped it and the stale page would stay cached for the whole timeout.
+"""
+import calendar
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.core.cache import cache, caches
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .routers import use_primary
+
+
+def new_version():
+    return time.time_ns()
+
+
+def get_versions(names):
+    """
+    Return the current value of each version key in `names`.
+    """
+    versions = caches['versions'].get_many(names)
+    missing = {name: new_version() for name in names if name not in versions}
+    if missing:
+        caches['versions'].set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[name] for name in names]
+
+
+def bump_versions(names):
+    if names:
+        caches['versions'].set_many(dict.fromkeys(names, new_version()), timeout=None)
+
+
+def is_cacheable(request, response):
+    # Pages with a CSRF token, cookies or flash messages belong to one visitor.
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        and not len(messages.get_messages(request))
+    )
+
+
+def page_key(name, request, names):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return ':'.join(['page', name, path, *map(str, get_versions(names))])
+
+
+def cache_view(versions=None, timeout=None):
+    """
+    Cache the responses of a view to anonymous GET requests by full path.
+
+    `versions(request, *args, **kwargs)` returns the version keys the page
+    depends on, bumping any of them with `bump_versions()` invalidates it.
+    Works with sync and async views.
+    """
+    def decorator(view):
+        name = f'{view.__module__}.{view.__name__}'
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                user = await request.auser()
+                if request.method not in ('GET', 'HEAD') or user.is_authenticated:
+                    return await view(request, *args, **kwargs)
+
+                names = versions(request, *args, **kwargs) if versions else []
+                key = await sync_to_async(page_key)(name, request, names)
+                response = await cache.aget(key)
+                if response is None:
+                    with use_primary():
+                        response = await view(request, *args, **kwargs)
+                    if await sync_to_async(is_cacheable)(request, response):
+                        await cache.aset(key, response, timeout)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            names = versions(request, *args, **kwargs) if versions else []
+            key = page_key(name, request, names)
+            response = cache.get(key)
+            if response is None:
+                with use_primary():
+                    response = view(request, *args, **kwargs)
+                if is_cacheable(request, response):
+                    cache.set(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def async_condition(etag_func=None, last_modified_func=None):
+    """
+    Django's `condition()` for async views whose validators query the
+    database: they run in a thread with `sync_to_async`.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            etag = last_modified = None
+            if etag_func:
+                etag = await sync_to_async(etag_func)(request, *args, **kwargs)
+                etag = quote_etag(etag) if etag else None
+            if last_modified_func:
+                date = await sync_to_async(last_modified_func)(request, *args, **kwargs)
+                last_modified = calendar.timegm(date.utctimetuple()) if date else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,53 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .routers import use_primary
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read from the primary for `REPLICA_PIN_SECONDS` after a user's own write
+    (any unsafe request, e.g. a watchlist edit), so the replica lag is not
+    visible to them. The deadline is kept in a cookie.
+    """
+    cookie_name = 'primary_until'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_pinned(request):
+            return self.pin(request, self.get_response(request))
+        with use_primary():
+            return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        if not self.is_pinned(request):
+            return self.pin(request, await self.get_response(request))
+        with use_primary():
+            return self.pin(request, await self.get_response(request))
+
+    def is_pinned(self, request):
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def pin(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and response.status_code < 400:
+            response.set_cookie(
+                self.cookie_name,
+                str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,47 @@
+"""
+Routing of heavy read-only queries to the optional `replica` database.
+
+Reads of the price history and its rollups go to the replica when it is
+configured; everything else, and every write, uses `default`. Code that
+must see its own writes, like the ingestion, runs inside `use_primary()`,
+and `ReplicaPinningMiddleware` does the same for a user's requests shortly
+after they changed something.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+REPLICA = 'replica'
+
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+@contextmanager
+def use_primary():
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            REPLICA in settings.DATABASES
+            and not _pinned.get()
+            and model._meta.label_lower in settings.REPLICA_MODELS
+        ):
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
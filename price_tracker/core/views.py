@@ -1,6 +1,9 @@
 from django.shortcuts import render
 
+from .cache import cache_view
 
+
+@cache_view()
 def home(request):
     return render(request, 'core/main.html')
 
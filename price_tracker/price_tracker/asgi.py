@@ -3,6 +3,9 @@ ASGI config for price_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+This is the production entry point, run it with DJ_ASYNC_VIEWS=1:
+    uvicorn price_tracker.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 import os
+import tempfile
 from decouple import config
 
 from pathlib import Path
@@ -40,6 +41,7 @@ DJANGO_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.humanize',
+    'django.contrib.postgres',
 ]
 
 LOCAL_APPS = [
@@ -62,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'price_tracker.urls'
@@ -84,10 +87,22 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'price_tracker.wsgi.application'
 
+# Production runs the ASGI app (`uvicorn price_tracker.asgi:application`)
+# with the async catalog, product and export views of products/async_views.py.
+ASYNC_VIEWS = config('DJ_ASYNC_VIEWS', False, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Behind PgBouncer in transaction pooling mode (DJ_DB_PGBOUNCER) server-side
+# cursors are disabled, they do not survive the end of a transaction.
+# Persistent connections (CONN_MAX_AGE) are only reused by the WSGI
+# deployment: under ASGI every request runs in a new thread and would leave
+# its connection open, so the default is 0 with ASYNC_VIEWS (pool with
+# PgBouncer instead).
+DB_PGBOUNCER = config('DJ_DB_PGBOUNCER', False, cast=bool)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -96,7 +111,87 @@ DATABASES = {
         'PASSWORD': config('DJ_DBPASSWORD', 'password'),
         'HOST': config('DJ_DBHOST', 'localhost'),
         'PORT': config('DJ_DBPORT', 5432),
+        'CONN_MAX_AGE': config('DJ_DB_CONN_MAX_AGE', 0 if ASYNC_VIEWS else 60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DJ_DB_CONN_HEALTH_CHECKS', True, cast=bool),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+    }
+}
+
+# Optional read replica for the price history (core/routers.py), enabled by
+# DJ_REPLICA_DBHOST; the other parameters default to the primary's.
+if config('DJ_REPLICA_DBHOST', ''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': config('DJ_REPLICA_DBNAME', DATABASES['default']['NAME']),
+        'USER': config('DJ_REPLICA_DBUSER', DATABASES['default']['USER']),
+        'PASSWORD': config('DJ_REPLICA_DBPASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': config('DJ_REPLICA_DBHOST'),
+        'PORT': config('DJ_REPLICA_DBPORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_MODELS = [
+    'products.producthistory',
+    'products.productpricedaily',
+    'products.productpriceweekly',
+    'products.rollupwatermark',
+]
+# Seconds a user reads from the primary after one of their writes.
+REPLICA_PIN_SECONDS = config('DJ_REPLICA_PIN_SECONDS', 10, cast=int)
+
+# psycopg2 pool of the COPY ingestion path (products/db.py), used by the
+# crawler (CRAWLER_USE_COPY) and INGESTION_USE_COPY; the ORM does not use it.
+DB_POOL_MIN_SIZE = config('DJ_DB_POOL_MIN_SIZE', 1, cast=int)
+DB_POOL_MAX_SIZE = config('DJ_DB_POOL_MAX_SIZE', 10, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Pages are invalidated through version keys when prices are written (see
+# core/cache.py), so the cache must be shared by the web and crawl processes:
+# file based by default, Redis (requires the `redis` package) with DJ_REDIS_URL.
+# The version keys have their own cache: every ingestion batch bumps
+# hundreds of them and the file cache lists its whole directory on each
+# write, so they are kept apart from the pages, in a small directory.
+
+CACHE_TIMEOUT = config('DJ_CACHE_TIMEOUT', 60 * 60 * 24, cast=int)
+CACHE_DIR = config('DJ_CACHE_DIR', str(Path(tempfile.gettempdir()) / 'price_tracker_cache'))
+REDIS_URL = config('DJ_REDIS_URL', '')
+# Products share their page version with the other products of their
+# bucket, which bounds the version keys written per ingestion batch.
+PRODUCT_VERSION_BUCKETS = config('DJ_PRODUCT_VERSION_BUCKETS', 256, cast=int)
+
+if config('DJ_CACHE_DISABLED', False, cast=bool):
+    CACHE_BACKEND = VERSIONS_BACKEND = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+elif REDIS_URL:
+    CACHE_BACKEND = VERSIONS_BACKEND = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+else:
+    CACHE_BACKEND = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
+    VERSIONS_BACKEND = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': f'{CACHE_DIR}_versions',
+        'OPTIONS': {'MAX_ENTRIES': PRODUCT_VERSION_BUCKETS * 2 + 100},
+    }
+
+CACHES = {
+    'default': {
+        **CACHE_BACKEND,
+        'TIMEOUT': CACHE_TIMEOUT,
+        'KEY_PREFIX': 'price_tracker',
+    },
+    'versions': {
+        **VERSIONS_BACKEND,
+        'TIMEOUT': None,
+        'KEY_PREFIX': 'price_tracker',
+    },
 }
 
 
@@ -159,4 +254,62 @@ EMAIL_PORT = config('DJ_EMAIL_PORT', 25)
 EMAIL_USE_TLS = config('DJ_EMAIL_USE_TLS', False)
 
 # The number of seconds a password reset link is valid for (default: 3 days).
-PASSWORD_RESET_TIMEOUT = 60 * 60 * 24 * 3
\ No newline at end of file
+PASSWORD_RESET_TIMEOUT = 60 * 60 * 24 * 3
+
+# Crawler settings
+CRAWLER_MAX_CONNECTIONS = config('DJ_CRAWLER_MAX_CONNECTIONS', 100, cast=int)
+CRAWLER_PER_STORE_CONCURRENCY = config('DJ_CRAWLER_PER_STORE_CONCURRENCY', 10, cast=int)
+CRAWLER_TIMEOUT = config('DJ_CRAWLER_TIMEOUT', 20, cast=float)
+CRAWLER_BATCH_SIZE = config('DJ_CRAWLER_BATCH_SIZE', 500, cast=int)
+CRAWLER_USER_AGENT = config('DJ_CRAWLER_USER_AGENT', 'PriceTracker/1.0')
+# Processes parsing the fetched pages, 0: parse in the crawl process.
+CRAWLER_PARSE_WORKERS = config('DJ_CRAWLER_PARSE_WORKERS', os.cpu_count() or 1, cast=int)
+# Default request rate per store host, 0: unlimited.
+CRAWLER_REQUESTS_PER_SECOND = config('DJ_CRAWLER_REQUESTS_PER_SECOND', 0, cast=float)
+# The crawler writes its price batches with COPY on the psycopg2 pool
+# (products/db.py); its other queries go through the Django connection.
+CRAWLER_USE_COPY = config('DJ_CRAWLER_USE_COPY', True, cast=bool)
+
+# Crawl scheduler (products/scheduler.py), intervals in seconds
+SCHEDULER_MIN_INTERVAL = config('DJ_SCHEDULER_MIN_INTERVAL', 15 * 60, cast=int)
+SCHEDULER_MAX_INTERVAL = config('DJ_SCHEDULER_MAX_INTERVAL', 7 * 24 * 60 * 60, cast=int)
+SCHEDULER_BACKOFF = config('DJ_SCHEDULER_BACKOFF', 2, cast=float)
+SCHEDULER_WATCHED_FACTOR = config('DJ_SCHEDULER_WATCHED_FACTOR', 0.25, cast=float)
+SCHEDULER_WINDOW_DAYS = config('DJ_SCHEDULER_WINDOW_DAYS', 30, cast=int)
+
+# Crawl work queue (products/crawl_queue.py), shared by `crawl_queue work` processes
+CRAWL_QUEUE_TASK_SIZE = config('DJ_CRAWL_QUEUE_TASK_SIZE', 200, cast=int)
+CRAWL_QUEUE_LEASE_SECONDS = config('DJ_CRAWL_QUEUE_LEASE_SECONDS', 300, cast=int)
+CRAWL_QUEUE_MAX_ATTEMPTS = config('DJ_CRAWL_QUEUE_MAX_ATTEMPTS', 3, cast=int)
+# Workers crawling the same store at once.
+CRAWL_QUEUE_LEASES_PER_STORE = config('DJ_CRAWL_QUEUE_LEASES_PER_STORE', 1, cast=int)
+CRAWL_QUEUE_RETENTION_DAYS = config('DJ_CRAWL_QUEUE_RETENTION_DAYS', 7, cast=int)
+
+# Days the CrawlRun records and their per-store stats are kept.
+CRAWL_METRICS_RETENTION_DAYS = config('DJ_CRAWL_METRICS_RETENTION_DAYS', 30, cast=int)
+
+# Products upserted per statement by `manage.py discover_products`
+DISCOVERY_BATCH_SIZE = config('DJ_DISCOVERY_BATCH_SIZE', 2000, cast=int)
+
+# Ingestion settings
+INGESTION_CHUNK_SIZE = config('DJ_INGESTION_CHUNK_SIZE', 1000, cast=int)
+INGESTION_USE_COPY = config('DJ_INGESTION_USE_COPY', False, cast=bool)
+
+# Partition ProductHistory by month (applied by migration products.0003 or
+# `manage.py history_partitions --convert`).
+PRODUCT_HISTORY_PARTITIONED = config('DJ_HISTORY_PARTITIONED', False, cast=bool)
+
+# Email queue settings
+EMAIL_QUEUE_BATCH_SIZE = config('DJ_EMAIL_QUEUE_BATCH_SIZE', 100, cast=int)
+EMAIL_QUEUE_MAX_ATTEMPTS = config('DJ_EMAIL_QUEUE_MAX_ATTEMPTS', 5, cast=int)
+EMAIL_QUEUE_BACKOFF = config('DJ_EMAIL_QUEUE_BACKOFF', 60, cast=int)
+# Seconds a worker holds the emails it is sending before they can be retried.
+EMAIL_QUEUE_CLAIM_SECONDS = config('DJ_EMAIL_QUEUE_CLAIM_SECONDS', 600, cast=int)
+
+# Price alerts
+ALERT_DIGEST_WINDOW = config('DJ_ALERT_DIGEST_WINDOW', 60, cast=int)
+SITE_DOMAIN = config('DJ_SITE_DOMAIN', 'localhost:8000')
+SITE_PROTOCOL = config('DJ_SITE_PROTOCOL', 'http')
+
+# Days of raw ProductHistory kept by `manage.py rollup_history` (0: keep everything).
+HISTORY_RETENTION_DAYS = config('DJ_HISTORY_RETENTION_DAYS', 0, cast=int)
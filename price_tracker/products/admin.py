@@ -1,3 +1,134 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import (
+    CrawlRun,
+    CrawlStoreStats,
+    CrawlTask,
+    PriceAlert,
+    Product,
+    ProductHistory,
+    ProductLatestPrice,
+    ProductPriceDaily,
+    ProductPriceWeekly,
+    RollupWatermark,
+    Store,
+    Watch,
+)
+
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """
+    Rows written by the crawler and the background jobs, only browsed here.
+    """
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Store)
+class StoreAdmin(admin.ModelAdmin):
+    list_display = ['name', 'shortname', 'base_url', 'enabled', 'crawl_concurrency', 'requests_per_second']
+    list_filter = ['enabled']
+    search_fields = ['name', 'shortname']
+
+
+@admin.register(Product)
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ['name', 'store', 'brand', 'sku', 'next_check_at', 'check_interval', 'volatility']
+    list_filter = ['store']
+    list_select_related = ['store']
+    search_fields = ['name', 'brand', 'sku', 'match_key']
+    readonly_fields = ['match_key', 'http_etag', 'http_last_modified']
+    show_full_result_count = False
+
+
+@admin.register(ProductHistory)
+class ProductHistoryAdmin(ReadOnlyAdmin):
+    list_display = ['product', 'price', 'last_price', 'discount_rate', 'date']
+    list_select_related = ['product__store']
+    raw_id_fields = ['product']
+    date_hierarchy = 'date'
+    show_full_result_count = False
+
+
+@admin.register(ProductLatestPrice)
+class ProductLatestPriceAdmin(ReadOnlyAdmin):
+    list_display = ['product', 'price', 'last_price', 'discount_rate', 'date']
+    list_select_related = ['product__store']
+    raw_id_fields = ['product']
+    show_full_result_count = False
+
+
+@admin.register(ProductPriceDaily, ProductPriceWeekly)
+class ProductPriceRollupAdmin(ReadOnlyAdmin):
+    list_display = ['product', 'date', 'open', 'close', 'min', 'max', 'count']
+    list_select_related = ['product__store']
+    raw_id_fields = ['product']
+    date_hierarchy = 'date'
+    show_full_result_count = False
+
+
+@admin.register(RollupWatermark)
+class RollupWatermarkAdmin(ReadOnlyAdmin):
+    list_display = ['name', 'last_id', 'updated_at']
+
+
+@admin.register(Watch)
+class WatchAdmin(admin.ModelAdmin):
+    list_display = ['user', 'product', 'target_price', 'drop_rate', 'notified_price', 'created_at']
+    list_select_related = ['user', 'product__store']
+    raw_id_fields = ['user', 'product']
+    search_fields = ['user__email', 'product__name']
+
+
+@admin.register(PriceAlert)
+class PriceAlertAdmin(ReadOnlyAdmin):
+    list_display = ['user', 'product', 'price', 'previous_price', 'created_at', 'sent_at']
+    list_select_related = ['user', 'product__store']
+    raw_id_fields = ['watch', 'user', 'product']
+    list_filter = [('sent_at', admin.EmptyFieldListFilter)]
+
+
+@admin.register(CrawlTask)
+class CrawlTaskAdmin(ReadOnlyAdmin):
+    list_display = ['id', 'store', 'status', 'attempts', 'leased_by', 'leased_until', 'checked', 'created_at', 'finished_at']
+    list_filter = ['status', 'store']
+    list_select_related = ['store']
+
+
+class CrawlStoreStatsInline(admin.TabularInline):
+    model = CrawlStoreStats
+    fields = [
+        'store', 'products', 'pages', 'bytes', 'failed', 'not_modified', 'parse_failures', 'rows_written',
+        'price_changes', 'fetch_p50', 'fetch_p95', 'parse_p50', 'parse_p95',
+    ]
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CrawlRun)
+class CrawlRunAdmin(ReadOnlyAdmin):
+    list_display = [
+        'id', 'started_at', 'duration', 'status', 'worker', 'products', 'pages', 'bytes', 'failed',
+        'parse_failures', 'rows_written', 'price_changes', 'fetch_seconds', 'parse_seconds', 'write_seconds',
+    ]
+    list_filter = ['status']
+    date_hierarchy = 'started_at'
+    inlines = [CrawlStoreStatsInline]
+
+
+@admin.register(CrawlStoreStats)
+class CrawlStoreStatsAdmin(ReadOnlyAdmin):
+    list_display = [
+        'run', 'store', 'pages', 'bytes', 'failed', 'parse_failures', 'rows_written', 'price_changes',
+        'fetch_p50', 'fetch_p95', 'parse_p50', 'parse_p95',
+    ]
+    list_filter = ['store']
+    list_select_related = ['run', 'store']
@@ -0,0 +1,128 @@
+import datetime
+import itertools
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.template import loader
+from django.utils import timezone
+
+from accounts.models import QueuedEmail
+
+from .models import PriceAlert, ProductLatestPrice, Watch
+
+
+def evaluate_alerts(product_ids):
+    """
+    Create a `PriceAlert` for every watch of `product_ids` whose current
+    price reached its target price or dropped `drop_rate` percent below its
+    reference price, unless it was already notified at that price or lower.
+
+    Watches created before their product had a price take its first price
+    as their reference price. All the watches are checked with one query
+    joined to the latest price snapshot, and written with one INSERT and one
+    UPDATE.
+    """
+    if not product_ids:
+        return []
+
+    price = F('product__latest_price__price')
+    reached = (
+        Q(target_price__isnull=False, target_price__gte=price)
+        | Q(drop_rate__isnull=False, reference_price__isnull=False,
+            product__latest_price__price__lte=F('reference_price') * (1 - F('drop_rate') / 100))
+    )
+    not_notified = Q(notified_price__isnull=True) | Q(notified_price__gt=price)
+    latest = ProductLatestPrice.objects.filter(product=OuterRef('product')).values('price')[:1]
+
+    with transaction.atomic():
+        Watch.objects.filter(
+            product_id__in=product_ids, reference_price__isnull=True, product__latest_price__isnull=False,
+        ).update(reference_price=Subquery(latest))
+        watches = list(
+            Watch.objects.filter(product_id__in=product_ids)
+            .filter(reached, not_notified)
+            .select_for_update(of=('self',), skip_locked=True)
+            .values_list('pk', 'user_id', 'product_id', 'notified_price', 'reference_price', 'product__latest_price__price')
+        )
+        if not watches:
+            return []
+
+        alerts = PriceAlert.objects.bulk_create([
+            PriceAlert(
+                watch_id=watch_id,
+                user_id=user_id,
+                product_id=product_id,
+                price=current,
+                previous_price=notified if notified is not None else reference,
+            )
+            for watch_id, user_id, product_id, notified, reference, current in watches
+        ])
+        Watch.objects.filter(pk__in=[watch[0] for watch in watches]).update(notified_price=Subquery(latest))
+    return alerts
+
+
+def window_start(now, minutes):
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    window = datetime.timedelta(minutes=minutes)
+    return epoch + (now - epoch) // window * window
+
+
+def queue_alert_digests(window=None, now=None):
+    """
+    Queue one email per user with all the pending price alerts created
+    before the current `window` (in minutes), and mark them as sent.
+
+    The alerts are locked with SKIP LOCKED in the transaction that queues
+    the emails, and only the ones read are marked as sent, so an alert
+    committed during the run waits for the next one, and concurrent runs do
+    not email the same alerts. The block of each product is rendered once
+    per run and reused for every recipient. Returns the number of queued
+    emails.
+    """
+    window = window or settings.ALERT_DIGEST_WINDOW
+    until = window_start(now or timezone.now(), window)
+    alerts = (
+        PriceAlert.objects.filter(sent_at__isnull=True, created_at__lt=until)
+        .select_related('user', 'product__store', 'product__latest_price')
+        .select_for_update(of=('self',), skip_locked=True)
+        .order_by('user_id', 'product_id', '-created_at')
+    )
+    context = {
+        'domain': settings.SITE_DOMAIN,
+        'protocol': settings.SITE_PROTOCOL,
+    }
+    blocks = {}
+    emails = []
+    sent = []
+
+    with transaction.atomic():
+        for user, user_alerts in itertools.groupby(alerts.iterator(chunk_size=2000), key=lambda alert: alert.user):
+            # Only the latest alert of each product goes into the digest.
+            latest = []
+            for _, product_alerts in itertools.groupby(user_alerts, key=lambda alert: alert.product_id):
+                product_alerts = list(product_alerts)
+                latest.append(product_alerts[0])
+                sent.extend(alert.pk for alert in product_alerts)
+
+            for alert in latest:
+                if alert.product_id not in blocks:
+                    blocks[alert.product_id] = loader.render_to_string(
+                        'emails/price_alert_product.txt', {**context, 'product': alert.product}
+                    )
+            email_context = {
+                **context,
+                'user': user,
+                'alerts': latest,
+                'blocks': [blocks[alert.product_id] for alert in latest],
+            }
+            subject = loader.render_to_string('emails/price_alert_subject.txt', email_context)
+            emails.append(QueuedEmail(
+                subject="".join(subject.splitlines()),
+                body=loader.render_to_string('emails/price_alert_email.html', email_context),
+                to_email=user.email,
+            ))
+
+        QueuedEmail.objects.bulk_create(emails, batch_size=1000)
+        PriceAlert.objects.filter(pk__in=sent).update(sent_at=timezone.now())
+    return len(emails)
@@ -0,0 +1,139 @@
+"""
+Price analytics computed with NumPy over `ProductHistory`.
+
+History rows are loaded with `values_list` into arrays and every statistic
+is computed with vectorized operations, without creating model instances.
+Since the ingestion only writes a row when the price changes, each series
+is a step function: the price of a row holds until the next row.
+"""
+import numpy as np
+from django.db.models import F, FloatField, Func
+from django.utils import timezone
+
+from .models import ProductHistory
+
+
+DAY = 24 * 60 * 60
+
+
+class Epoch(Func):
+    template = 'EXTRACT(EPOCH FROM %(expressions)s)'
+    output_field = FloatField()
+
+
+def load_history(**filters):
+    """
+    Return `{product_id: (timestamps, price, last_price, discount_rate)}`
+    for the history rows matching `filters`, ordered by date.
+    """
+    rows = (
+        ProductHistory.objects.filter(**filters)
+        .order_by('product_id', 'date')
+        .values_list('product_id', Epoch(F('date')), 'price', 'last_price', 'discount_rate')
+    )
+    data = np.array(list(rows), dtype=float).reshape(-1, 5)
+    if not len(data):
+        return {}
+    product_ids, starts = np.unique(data[:, 0].astype(np.int64), return_index=True)
+    series = np.split(data[:, 1:], starts[1:])
+    return {
+        int(product_id): (values[:, 0], values[:, 1], values[:, 2], values[:, 3])
+        for product_id, values in zip(product_ids, series)
+    }
+
+
+def range_reduce(values, starts, ends, ufunc):
+    """
+    Apply `ufunc` (e.g. `np.minimum`) over `values[starts[i]:ends[i] + 1]`
+    for every `i` using a sparse table, `starts <= ends` is required.
+    """
+    table = [values]
+    width = 1
+    while width * 2 <= len(values):
+        previous = table[-1]
+        table.append(ufunc(previous[:-width], previous[width:]))
+        width *= 2
+
+    lengths = ends - starts + 1
+    levels = np.floor(np.log2(np.maximum(lengths, 1))).astype(np.int64)
+    result = np.empty(len(starts), dtype=values.dtype)
+    for level in np.unique(levels):
+        mask = levels == level
+        row = table[level]
+        result[mask] = ufunc(row[starts[mask]], row[ends[mask] - (1 << level) + 1])
+    return result
+
+
+def window_starts(timestamps, days):
+    # First row of each window, including the row whose price was in effect
+    # when the window started.
+    starts = np.searchsorted(timestamps, timestamps - days * DAY, side='right') - 1
+    return np.clip(starts, 0, None)
+
+
+def previous_rolling_min(timestamps, price, days):
+    """
+    Lowest price over the `days` before each row, excluding the row itself,
+    `inf` for the first row.
+    """
+    index = np.arange(len(price))
+    starts = window_starts(timestamps, days)
+    result = np.full(len(price), np.inf)
+    has_previous = index > 0
+    if has_previous.any():
+        result[has_previous] = range_reduce(
+            price, np.minimum(starts[has_previous], index[has_previous] - 1), index[has_previous] - 1, np.minimum
+        )
+    return result
+
+
+def analyze(timestamps, price, last_price, discount_rate, days=30, now=None):
+    """
+    Summary statistics of one price series at `now` (default: the current
+    time). The `days` window and the changes per day are measured up to
+    `now`, the window includes the price in effect when it started.
+
+    `suspicious_discount` flags a discount whose price is not lower than the
+    lowest price of the previous `days`, i.e. the reference price was
+    raised before the "discount".
+    """
+    lowest_before = previous_rolling_min(timestamps, price, days)
+    is_lowest = price < lowest_before
+    discounted = np.nan_to_num(discount_rate) > 0
+    suspicious = discounted & (price >= lowest_before)
+
+    returns = np.diff(np.log(price)) if len(price) > 1 and (price > 0).all() else np.empty(0)
+    now = max((now or timezone.now()).timestamp(), timestamps[-1])
+    start = max(0, np.searchsorted(timestamps, now - days * DAY, side='right') - 1)
+    span_days = (now - timestamps[0]) / DAY
+
+    return {
+        'current_price': float(price[-1]),
+        'all_time_low': float(price.min()),
+        'all_time_high': float(price.max()),
+        f'min_{days}d': float(price[start:].min()),
+        f'max_{days}d': float(price[start:].max()),
+        f'lowest_in_{days}d': bool(is_lowest[-1]),
+        'volatility': float(returns.std()) if len(returns) else 0.0,
+        'changes_per_day': float((len(price) - 1) / span_days) if span_days else 0.0,
+        'discounts': int(discounted.sum()),
+        'suspicious_discounts': int(suspicious.sum()),
+        'current_discount_suspicious': bool(suspicious[-1]),
+    }
+
+
+def product_analytics(product, days=30, now=None):
+    series = load_history(product=product).get(getattr(product, 'pk', product))
+    return analyze(*series, days=days, now=now) if series else None
+
+
+def store_analytics(product_ids, days=30, now=None):
+    """
+    Statistics of a page of products of a store, their history is loaded at
+    once but never the whole store.
+    """
+    now = now or timezone.now()
+    return {
+        product_id: analyze(*series, days=days, now=now)
+        for product_id, series in load_history(product_id__in=list(product_ids)).items()
+    }
@@ -0,0 +1,300 @@
+"""
+Read-only JSON API, crawl metrics for staff and bulk history export.
+
+Lists are paginated with signed keyset cursors like the catalog; malformed
+cursors or dates are a 400. Product endpoints share the validators of the
+product page, so polling clients get a 304. The export streams CSV or
+NDJSON rows from a server-side cursor, or in keyset batches behind
+PgBouncer, so exporting the full history of a store uses constant memory.
+"""
+import csv
+import datetime
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core import signing
+from django.core.exceptions import BadRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Prefetch, Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
+
+from .cache import product_etag, product_last_modified
+from .catalog import InvalidCursor, filter_products, get_page_size, keyset_page
+from .crawl_queue import queue_status
+from .metrics import COUNTERS, store_summary
+from .models import CrawlRun, CrawlStoreStats, Product, ProductHistory, Store
+
+
+HISTORY_PAGE_SIZE = 500
+MAX_HISTORY_PAGE_SIZE = 5000
+EXPORT_CHUNK_SIZE = 5000
+HISTORY_CURSOR_SALT = 'products.api.history'
+METRICS_RUNS = 20
+MAX_METRICS_RUNS = 200
+
+EXPORT_FIELDS = ['id', 'product_id', 'price', 'last_price', 'discount_rate', 'date', 'store', 'sku']
+
+
+def store_data(store):
+    return {
+        'id': store.pk,
+        'name': store.name,
+        'shortname': store.shortname,
+        'base_url': store.base_url,
+        'image': store.image,
+    }
+
+
+def product_data(product):
+    latest = getattr(product, 'latest_price', None)
+    return {
+        'id': product.pk,
+        'store': product.store.shortname,
+        'name': product.name,
+        'brand': product.brand,
+        'model': product.model,
+        'sku': product.sku,
+        'categories': product.categories,
+        'link': product.link,
+        'image': product.image,
+        'match_key': product.match_key,
+        'price': latest and latest.price,
+        'last_price': latest and latest.last_price,
+        'discount_rate': latest and latest.discount_rate,
+        'date': latest and latest.date,
+    }
+
+
+def get_since(request):
+    since = request.GET.get('since')
+    if not since:
+        return None
+    try:
+        date = parse_datetime(since) or datetime.datetime.fromisoformat(since)
+    except ValueError:
+        raise BadRequest('Invalid date')
+    return date if timezone.is_aware(date) else timezone.make_aware(date)
+
+
+def store_list(request):
+    stores = Store.objects.filter(enabled=True).order_by('name')
+    return JsonResponse({'results': [store_data(store) for store in stores]})
+
+
+def store_detail(request, shortname):
+    store = get_object_or_404(Store, shortname=shortname, enabled=True)
+    return JsonResponse(store_data(store))
+
+
+def product_list(request):
+    """
+    Same filters, sorts and cursors as the catalog page.
+    """
+    try:
+        products, next_cursor = keyset_page(
+            filter_products(request.GET),
+            sort=request.GET.get('sort'),
+            cursor=request.GET.get('cursor'),
+            size=get_page_size(request.GET),
+        )
+    except InvalidCursor:
+        raise BadRequest('Invalid cursor')
+    return JsonResponse({
+        'results': [product_data(product) for product in products],
+        'next_cursor': next_cursor,
+    })
+
+
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
+def product_detail(request, pk):
+    product = get_object_or_404(
+        Product.objects.select_related('store', 'latest_price'), pk=pk, store__enabled=True
+    )
+    return JsonResponse(product_data(product))
+
+
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
+def product_history(request, pk):
+    """
+    Price history of a product, newest first, `size` rows per page.
+    """
+    get_object_or_404(Product.objects.only('pk'), pk=pk)
+    try:
+        size = max(1, min(int(request.GET.get('size', HISTORY_PAGE_SIZE)), MAX_HISTORY_PAGE_SIZE))
+    except ValueError:
+        size = HISTORY_PAGE_SIZE
+
+    history = ProductHistory.objects.filter(product_id=pk).order_by('-date', '-id')
+    since = get_since(request)
+    if since is not None:
+        history = history.filter(date__gte=since)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            date, last_id = signing.loads(cursor, salt=HISTORY_CURSOR_SALT)
+            date = datetime.datetime.fromisoformat(date)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise BadRequest('Invalid cursor')
+        history = history.filter(Q(date__lt=date) | Q(date=date, id__lt=last_id))
+
+    rows = list(history.values('id', 'price', 'last_price', 'discount_rate', 'date')[:size + 1])
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = signing.dumps([rows[-1]['date'].isoformat(), rows[-1]['id']], salt=HISTORY_CURSOR_SALT)
+    return JsonResponse({'product': pk, 'results': rows, 'next_cursor': next_cursor})
+
+
+class Echo:
+    """
+    File-like object whose `write` returns the value, for `csv.writer`.
+    """
+    def write(self, value):
+        return value
+
+
+def export_queryset(request):
+    history = ProductHistory.objects.all()
+    if request.GET.get('store'):
+        history = history.filter(product__store__shortname=request.GET['store'])
+    if request.GET.get('product', '').isdigit():
+        history = history.filter(product_id=request.GET['product'])
+    since = get_since(request)
+    if since is not None:
+        history = history.filter(date__gte=since)
+    # values() rather than values_list(): only its iterable is lazy enough
+    # for aiterator() in the async export.
+    return history.order_by('product_id', 'date', 'id').values(
+        'id', 'product_id', 'price', 'last_price', 'discount_rate', 'date',
+        store=F('product__store__shortname'),
+        sku=F('product__sku'),
+    )
+
+
+def after_row(row):
+    # Rows after `row` in the export order (product_id, date, id).
+    return (
+        Q(product_id__gt=row['product_id'])
+        | Q(product_id=row['product_id'], date__gt=row['date'])
+        | Q(product_id=row['product_id'], date=row['date'], id__gt=row['id'])
+    )
+
+
+def export_rows(queryset):
+    """
+    Iterate over the export rows with a server-side cursor, or with keyset
+    batches when server-side cursors are disabled (PgBouncer), since a
+    client-side cursor would load every row at once.
+    """
+    if not settings.DATABASES['default'].get('DISABLE_SERVER_SIDE_CURSORS'):
+        yield from queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return
+    batch = list(queryset[:EXPORT_CHUNK_SIZE])
+    while batch:
+        yield from batch
+        if len(batch) < EXPORT_CHUNK_SIZE:
+            break
+        batch = list(queryset.filter(after_row(batch[-1]))[:EXPORT_CHUNK_SIZE])
+
+
+async def aexport_rows(queryset):
+    if not settings.DATABASES['default'].get('DISABLE_SERVER_SIDE_CURSORS'):
+        async for row in queryset.aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield row
+        return
+    batch = [row async for row in queryset[:EXPORT_CHUNK_SIZE]]
+    while batch:
+        for row in batch:
+            yield row
+        if len(batch) < EXPORT_CHUNK_SIZE:
+            break
+        batch = [row async for row in queryset.filter(after_row(batch[-1]))[:EXPORT_CHUNK_SIZE]]
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def stream_ndjson(rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+@staff_member_required
+def history_export(request, format):
+    """
+    Stream the history filtered by `store`, `product` and `since` as CSV or
+    NDJSON.
+    """
+    if format not in ('csv', 'ndjson'):
+        raise Http404('Unknown format')
+    rows = export_rows(export_queryset(request))
+    if format == 'csv':
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+    else:
+        response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="history.{format}"'
+    return response
+
+
+def crawl_stats_data(stats):
+    return {
+        'store': stats.store.shortname,
+        **{name: getattr(stats, name) for name in COUNTERS},
+        'fetch_p50': stats.fetch_p50,
+        'fetch_p95': stats.fetch_p95,
+        'parse_p50': stats.parse_p50,
+        'parse_p95': stats.parse_p95,
+    }
+
+
+def crawl_run_data(run):
+    return {
+        'id': run.pk,
+        'status': run.status,
+        'worker': run.worker,
+        'task': run.task_id,
+        'started_at': run.started_at,
+        'finished_at': run.finished_at,
+        'duration': run.duration,
+        **{name: getattr(run, name) for name in COUNTERS},
+        'write_seconds': run.write_seconds,
+        'stores': [crawl_stats_data(stats) for stats in run.store_stats.all()],
+    }
+
+
+@staff_member_required
+def crawl_metrics(request):
+    """
+    Last crawl runs with their per-store stats, the totals of each store
+    since `since` (default: the last 24 hours) and the work queue. Filter
+    with `?store=<shortname>`, `?runs=` sets the number of runs.
+    """
+    since = get_since(request) or timezone.now() - datetime.timedelta(days=1)
+    try:
+        limit = max(1, min(int(request.GET.get('runs', METRICS_RUNS)), MAX_METRICS_RUNS))
+    except ValueError:
+        limit = METRICS_RUNS
+
+    store = request.GET.get('store')
+    store_stats = CrawlStoreStats.objects.select_related('store').order_by('store__shortname')
+    runs = CrawlRun.objects.order_by('-started_at')
+    if store:
+        store_stats = store_stats.filter(store__shortname=store)
+        runs = runs.filter(store_stats__store__shortname=store)
+    runs = runs.prefetch_related(Prefetch('store_stats', queryset=store_stats))[:limit]
+
+    return JsonResponse({
+        'since': since,
+        'queue': queue_status(),
+        'stores': store_summary(since, store),
+        'runs': [crawl_run_data(run) for run in runs],
+    })
@@ -0,0 +1,110 @@
+"""
+Async versions of the catalog, search, product and export views.
+
+They are served instead of the sync views when `ASYNC_VIEWS` is set, which
+is meant for the ASGI deployment: queries go through the async ORM and a
+waiting client or a long export does not hold a worker thread. Templates
+are rendered with `sync_to_async`, since context processors read the
+session and the user.
+"""
+import csv
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import render, resolve_url
+
+from core.cache import async_condition, cache_view
+
+from . import views
+from .api import EXPORT_FIELDS, Echo, aexport_rows, export_queryset
+from .cache import catalog_versions, product_etag, product_last_modified, product_versions, set_card_versions
+from .catalog import InvalidCursor, filter_products, get_page_size, keyset_queryset, search_queryset, split_page
+from .forms import WatchForm
+from .history import price_series
+from .models import Product, Store
+
+
+async def enabled_stores():
+    return [store async for store in Store.objects.filter(enabled=True).order_by('name')]
+
+
+@cache_view(catalog_versions)
+async def home(request):
+    size = get_page_size(request.GET)
+    try:
+        products, field = keyset_queryset(
+            filter_products(request.GET),
+            sort=request.GET.get('sort'),
+            cursor=request.GET.get('cursor'),
+        )
+    except InvalidCursor:
+        raise Http404('Invalid cursor')
+    products, next_cursor = split_page([product async for product in products[:size + 1]], field, size)
+
+    context = {
+        'products': await sync_to_async(set_card_versions)(products),
+        'stores': await enabled_stores(),
+        'next_query': views.get_next_query(request, next_cursor),
+    }
+    return await sync_to_async(render)(request, 'products/home.html', context)
+
+
+@cache_view(catalog_versions)
+async def search(request):
+    query = request.GET.get('q', '')
+    products = search_queryset(filter_products(request.GET), query)[:get_page_size(request.GET)]
+    context = {
+        'products': await sync_to_async(set_card_versions)([product async for product in products]),
+        'stores': await enabled_stores(),
+        'query': query,
+    }
+    return await sync_to_async(render)(request, 'products/home.html', context)
+
+
+@async_condition(etag_func=product_etag, last_modified_func=product_last_modified)
+@cache_view(product_versions)
+async def product_details(request, pk):
+    try:
+        product = await Product.objects.select_related('store', 'latest_price').aget(pk=pk)
+    except Product.DoesNotExist:
+        raise Http404('No Product matches the given query.')
+    context = {
+        'product': product,
+        'history': await sync_to_async(price_series)(product, **views.get_series_options(request)),
+        'watch_form': WatchForm(),
+    }
+    return await sync_to_async(render)(request, 'products/product_details.html', context)
+
+
+async def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    async for row in rows:
+        yield writer.writerow(row.values())
+
+
+async def stream_ndjson(rows):
+    encoder = DjangoJSONEncoder()
+    async for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+async def history_export(request, format):
+    """
+    Same as `api.history_export`, rows are read with `aexport_rows()`.
+    """
+    user = await request.auser()
+    if not (user.is_active and user.is_staff):
+        return redirect_to_login(request.get_full_path(), resolve_url('admin:login'))
+    if format not in ('csv', 'ndjson'):
+        raise Http404('Unknown format')
+
+    rows = aexport_rows(export_queryset(request))
+    if format == 'csv':
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+    else:
+        response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="history.{format}"'
+    return response
@@ -0,0 +1,79 @@
+"""
+Cache version keys of the catalog and product pages.
+
+`invalidate_products()` is called by the ingestion after every write and by
+the model signals, so cached pages change as soon as the prices do. The
+same versions and the latest price date are the HTTP validators of the
+product views (`condition` decorator), so polling clients get a 304.
+"""
+from django.conf import settings
+from django.contrib import messages
+
+from core.cache import bump_versions, get_versions
+
+from .models import ProductLatestPrice
+
+
+# Every product page and card, bumped by store changes and full rebuilds.
+ALL_VERSION = 'products:all'
+# Listings and search results, bumped by any product or price change.
+CATALOG_VERSION = 'products:catalog'
+
+
+def product_version(pk):
+    # Shared by the products of the same bucket (PRODUCT_VERSION_BUCKETS).
+    return f'products:bucket:{int(pk) % settings.PRODUCT_VERSION_BUCKETS}'
+
+
+def catalog_versions(request, *args, **kwargs):
+    return [ALL_VERSION, CATALOG_VERSION]
+
+
+def product_versions(request, pk, *args, **kwargs):
+    return [ALL_VERSION, product_version(pk)]
+
+
+def invalidate_products(product_ids=None):
+    """
+    Invalidate the listings and the pages of `product_ids`, or of every
+    product when `product_ids` is None.
+    """
+    if product_ids is None:
+        bump_versions([ALL_VERSION])
+    else:
+        bump_versions([CATALOG_VERSION, *{product_version(pk) for pk in product_ids}])
+
+
+def set_card_versions(products):
+    """
+    Set `cache_version` on `products`, the key of their cached card.
+    """
+    products = list(products)
+    names = [ALL_VERSION, *{product_version(product.pk) for product in products}]
+    versions = dict(zip(names, get_versions(names)))
+    for product in products:
+        product.cache_version = f'{versions[ALL_VERSION]}.{versions[product_version(product.pk)]}'
+    return products
+
+
+def has_messages(request):
+    return bool(len(messages.get_messages(request)))
+
+
+def product_last_modified(request, pk, *args, **kwargs):
+    # No validators while flash messages are pending (e.g. after watching
+    # the product): a 304 would never show them.
+    if has_messages(request):
+        return None
+    return ProductLatestPrice.objects.filter(product_id=pk).values_list('date', flat=True).first()
+
+
+def product_etag(request, pk, *args, **kwargs):
+    """
+    Changes with every price written and every product or store change.
+    Pages also show the user, e.g. the watch form.
+    """
+    if has_messages(request):
+        return None
+    versions = '.'.join(map(str, get_versions(product_versions(request, pk))))
+    return f'{pk}-{versions}-{request.user.pk or 0}'
@@ -0,0 +1,129 @@
+from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+from django.core import signing
+from django.db.models import Q
+from django.db.models.functions import Greatest
+
+from .models import Product
+
+
+PAGE_SIZE = 48
+MAX_PAGE_SIZE = 100
+MIN_QUERY_LENGTH = 3
+CURSOR_SALT = 'products.catalog'
+
+# sort name -> (ordering field, tie-breaker on the same table)
+SORTS = {
+    'price': ('latest_price__price', 'latest_price__product'),
+    'discount': ('latest_price__discount_rate', 'latest_price__product'),
+}
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def filter_products(params, queryset=None):
+    """
+    Filter the catalog by `store` (short name), `brand` and `category`
+    (repeatable, products must have all of them).
+    """
+    if queryset is None:
+        queryset = Product.objects.filter(store__enabled=True)
+    queryset = queryset.select_related('store', 'latest_price')
+
+    if params.get('store'):
+        queryset = queryset.filter(store__shortname=params['store'])
+    if params.get('brand'):
+        queryset = queryset.filter(brand=params['brand'])
+    categories = [category for category in params.getlist('category') if category]
+    if categories:
+        queryset = queryset.filter(categories__contains=categories)
+    return queryset
+
+
+def get_page_size(params):
+    try:
+        size = int(params.get('size', PAGE_SIZE))
+    except ValueError:
+        return PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(queryset, sort=None, cursor=None, size=PAGE_SIZE):
+    """
+    Return `(items, next_cursor)` for one page of `queryset`.
+
+    Pages are addressed by the sort value and id of the last row instead of
+    an OFFSET, so every page costs the same index range scan. `sort` is one
+    of `SORTS`, optionally prefixed with `-`; by default the newest products
+    come first.
+    """
+    queryset, field = keyset_queryset(queryset, sort, cursor)
+    return split_page(list(queryset[:size + 1]), field, size)
+
+
+def keyset_queryset(queryset, sort=None, cursor=None):
+    """
+    Return `(queryset, field)`: `queryset` ordered by `sort` and starting
+    after `cursor`, and the ordering field of the cursor.
+    """
+    descending = sort is None or sort.startswith('-')
+    field, tie = SORTS.get((sort or '').lstrip('-'), (None, 'pk'))
+    if field:
+        queryset = queryset.filter(**{f'{field}__isnull': False})
+    else:
+        descending = True
+
+    prefix = '-' if descending else ''
+    ordering = [f'{prefix}{field}', f'{prefix}{tie}'] if field else [f'{prefix}{tie}']
+    queryset = queryset.order_by(*ordering)
+
+    if cursor:
+        try:
+            value, pk = signing.loads(cursor, salt=CURSOR_SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        lookup = 'lt' if descending else 'gt'
+        after = Q(**{f'{tie}__{lookup}': pk})
+        if field:
+            after = Q(**{f'{field}__{lookup}': value}) | (Q(**{field: value}) & after)
+        queryset = queryset.filter(after)
+    return queryset, field
+
+
+def split_page(items, field, size):
+    """
+    Return `(items, next_cursor)` from the first `size + 1` rows of a page.
+    """
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        value = getattr(last.latest_price, field.split('__')[-1]) if field else None
+        next_cursor = signing.dumps([value, last.pk], salt=CURSOR_SALT, compress=True)
+    return items, next_cursor
+
+
+def search_products(queryset, query, size=PAGE_SIZE):
+    """
+    Return the `size` products whose name or brand best match `query`.
+    """
+    return list(search_queryset(queryset, query)[:size])
+
+
+def search_queryset(queryset, query):
+    """
+    Products of `queryset` matching `query`, best matches first.
+
+    The `%>` (word similarity) and `%` (similarity) trigram operators are
+    answered by the `gin_trgm_ops` indexes on `name` and `brand`, results
+    are ranked by the best of both similarities.
+    """
+    query = query.strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return queryset.none()
+    return (
+        queryset.filter(Q(name__trigram_word_similar=query) | Q(brand__trigram_similar=query))
+        .annotate(rank=Greatest(TrigramWordSimilarity(query, 'name'), TrigramSimilarity('brand', query)))
+        .order_by('-rank', 'pk')
+    )
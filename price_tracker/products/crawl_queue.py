@@ -0,0 +1,217 @@
+"""
+Crawl work queue in Postgres, shared by any number of worker processes.
+
+`enqueue()` splits the due products of each store into `CrawlTask` rows of
+`CRAWL_QUEUE_TASK_SIZE` products, skipping the ones already queued.
+Workers call `lease()`, which takes the oldest available task of the store
+with the fewest active leases, locking the store rows with
+`FOR NO KEY UPDATE SKIP LOCKED` and re-checking the task status in the
+UPDATE, so concurrent workers never take the same task nor go over
+`CRAWL_QUEUE_LEASES_PER_STORE` leases per store (with the default of 1,
+the store concurrency and request rate of the crawler hold across all the
+workers). A lease lasts `CRAWL_QUEUE_LEASE_SECONDS` and is
+renewed by the worker while it crawls; the task of a crashed worker is
+leased again once its lease expires, up to `CRAWL_QUEUE_MAX_ATTEMPTS`
+times.
+"""
+import datetime
+import os
+import socket
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.routers import use_primary
+
+from .models import CrawlTask, Product, Store
+from .scheduler import due_products
+
+
+LEASE_SQL = """
+WITH active AS (
+    SELECT store_id, COUNT(*) AS leases FROM {task}
+    WHERE status = 'leased' AND leased_until >= %(now)s
+    GROUP BY store_id
+),
+picked AS (
+    SELECT task.id
+    FROM {store} store
+    LEFT JOIN active ON active.store_id = store.id
+    CROSS JOIN LATERAL (
+        SELECT id FROM {task} task
+        WHERE task.store_id = store.id AND (
+            task.status = 'pending' OR (task.status = 'leased' AND task.leased_until < %(now)s)
+        )
+        ORDER BY task.id
+        LIMIT 1
+    ) task
+    WHERE store.enabled AND COALESCE(active.leases, 0) < %(per_store)s
+    ORDER BY COALESCE(active.leases, 0), random()
+    LIMIT %(count)s
+    FOR NO KEY UPDATE OF store SKIP LOCKED
+)
+UPDATE {task} task SET
+    status = 'leased',
+    attempts = task.attempts + 1,
+    leased_by = %(worker)s,
+    leased_until = %(now)s + make_interval(secs => %(seconds)s)
+FROM picked
+WHERE task.id = picked.id
+    -- Re-checked on the latest row version: a worker whose snapshot predates
+    -- a concurrent lease of the same task must not take it over.
+    AND (task.status = 'pending' OR (task.status = 'leased' AND task.leased_until < %(now)s))
+RETURNING task.id
+"""
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+@use_primary()
+def enqueue(stores, all_products=False, task_size=None):
+    """
+    Queue the due products (every product with `all_products`) of `stores`
+    that are not in a pending or leased task. Returns the number of tasks.
+    """
+    task_size = task_size or settings.CRAWL_QUEUE_TASK_SIZE
+    queued = RawSQL(
+        f'SELECT unnest(product_ids) FROM {CrawlTask._meta.db_table} WHERE status IN (%s, %s)',
+        (CrawlTask.PENDING, CrawlTask.LEASED),
+    )
+    created = 0
+    for store in stores:
+        products = Product.objects.filter(store=store).order_by('id') if all_products else due_products(store)
+        product_ids = products.exclude(id__in=queued).values_list('id', flat=True)
+        tasks = []
+        for product_id in product_ids.iterator(chunk_size=10_000):
+            if not tasks or len(tasks[-1].product_ids) >= task_size:
+                tasks.append(CrawlTask(store=store, product_ids=[]))
+            tasks[-1].product_ids.append(product_id)
+        CrawlTask.objects.bulk_create(tasks, batch_size=1000)
+        created += len(tasks)
+    return created
+
+
+@use_primary()
+def lease(worker, count=1, seconds=None, per_store=None, max_attempts=None):
+    """
+    Lease up to `count` tasks (one per store) to `worker`. Tasks whose lease
+    expired after `max_attempts` are marked as failed instead.
+    """
+    now = timezone.now()
+    max_attempts = max_attempts or settings.CRAWL_QUEUE_MAX_ATTEMPTS
+    CrawlTask.objects.filter(status=CrawlTask.LEASED, leased_until__lt=now, attempts__gte=max_attempts).update(
+        status=CrawlTask.FAILED, finished_at=now, last_error='Lease expired',
+    )
+    sql = LEASE_SQL.format(task=CrawlTask._meta.db_table, store=Store._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, {
+            'now': now,
+            'worker': worker,
+            'count': count,
+            'seconds': seconds or settings.CRAWL_QUEUE_LEASE_SECONDS,
+            'per_store': per_store or settings.CRAWL_QUEUE_LEASES_PER_STORE,
+        })
+        task_ids = [row[0] for row in cursor.fetchall()]
+    return list(CrawlTask.objects.select_related('store').filter(id__in=task_ids).order_by('id'))
+
+
+def _owned(task, worker):
+    return CrawlTask.objects.filter(pk=task.pk, status=CrawlTask.LEASED, leased_by=worker)
+
+
+@use_primary()
+def renew(task, worker, seconds=None):
+    """
+    Extend the lease of `task`, False when `worker` lost it.
+    """
+    seconds = seconds or settings.CRAWL_QUEUE_LEASE_SECONDS
+    leased_until = timezone.now() + datetime.timedelta(seconds=seconds)
+    return bool(_owned(task, worker).update(leased_until=leased_until))
+
+
+@use_primary()
+def complete(task, worker, checked=0):
+    return bool(_owned(task, worker).update(
+        status=CrawlTask.DONE, checked=checked, finished_at=timezone.now(), leased_until=None, last_error='',
+    ))
+
+
+@use_primary()
+def release(task, worker, error=''):
+    """
+    Give `task` back to the queue, or fail it after `CRAWL_QUEUE_MAX_ATTEMPTS`.
+    """
+    failed = task.attempts >= settings.CRAWL_QUEUE_MAX_ATTEMPTS
+    return bool(_owned(task, worker).update(
+        status=CrawlTask.FAILED if failed else CrawlTask.PENDING,
+        finished_at=timezone.now() if failed else None,
+        leased_until=None,
+        last_error=error,
+    ))
+
+
+def purge(days=None):
+    """
+    Delete the tasks finished more than `days` ago.
+    """
+    days = days or settings.CRAWL_QUEUE_RETENTION_DAYS
+    since = timezone.now() - datetime.timedelta(days=days)
+    deleted, _ = CrawlTask.objects.filter(finished_at__lt=since).delete()
+    return deleted
+
+
+def queue_status(minutes=60):
+    """
+    Tasks of each store by status, with the tasks done and the products
+    they checked in the last `minutes`.
+    """
+    now = timezone.now()
+    since = now - datetime.timedelta(minutes=minutes)
+    active = Q(status=CrawlTask.LEASED, leased_until__gte=now)
+    return list(
+        CrawlTask.objects.values('store__shortname')
+        .annotate(
+            pending=Count('id', filter=Q(status=CrawlTask.PENDING)),
+            leased=Count('id', filter=active),
+            expired=Count('id', filter=Q(status=CrawlTask.LEASED) & ~active),
+            failed=Count('id', filter=Q(status=CrawlTask.FAILED)),
+            done=Count('id', filter=Q(status=CrawlTask.DONE, finished_at__gte=since)),
+            checked=Coalesce(Sum('checked', filter=Q(status=CrawlTask.DONE, finished_at__gte=since)), 0),
+        )
+        .order_by('store__shortname')
+    )
+
+
+class LeaseKeeper(threading.Thread):
+    """
+    Renew the lease of `task` every third of the lease until `stop()`.
+    `lost` is set when another worker took the task over.
+    """
+
+    def __init__(self, task, worker, seconds=None):
+        super().__init__(daemon=True)
+        self.task = task
+        self.worker = worker
+        self.seconds = seconds or settings.CRAWL_QUEUE_LEASE_SECONDS
+        self.stopped = threading.Event()
+        self.lost = False
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.seconds / 3):
+                if not renew(self.task, self.worker, self.seconds):
+                    self.lost = True
+                    return
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
@@ -0,0 +1,296 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .crawl_queue import worker_name
+from .extractors import autodiscover, timed_extract_price
+from .ingestion import PriceIngestor
+from .metrics import StoreStats, finish_run, start_run
+from .models import CrawlRun, Store, Product
+from .scheduler import due_products, reschedule, retry
+
+
+class CrawlStats:
+
+    def __init__(self):
+        self.fetched = 0
+        self.failed = 0
+        self.unparsed = 0
+        self.not_modified = 0
+        self.written = 0
+        self.unchanged = 0
+
+    def __str__(self):
+        return (f'fetched={self.fetched} failed={self.failed} unparsed={self.unparsed} '
+                f'not_modified={self.not_modified} written={self.written} unchanged={self.unchanged}')
+
+
+class TokenBucket:
+    """
+    Allow `rate` requests per second on average, with bursts of up to
+    `capacity` requests (by default requests are evenly spaced).
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Crawler:
+    """
+    Fetch the `link` of every product of the given stores concurrently and
+    store the parsed prices through a `PriceIngestor`.
+
+    A single `httpx.AsyncClient` keeps the connection pool for the whole run,
+    `per_store` workers are started for each store and prices are handed to
+    the ingestor in batches of `batch_size` observations, written with
+    `COPY` on the worker pool (`products.db`) unless `use_copy` is False.
+
+    Only the products due according to the schedule are fetched, unless
+    `all_products` is set, or only `product_ids` when given (the products
+    of a `CrawlTask`). At the end the products whose page was fetched (200
+    or 304) are rescheduled, the others are retried at their interval.
+
+    Stores can override the concurrency, the user agent and the request
+    rate, which is enforced by one `TokenBucket` per host shared by the
+    stores on it. Pages are requested with the ETag and Last-Modified of the
+    previous response, a 304 is counted as an unchanged price; the new
+    validators are only saved with the price extracted from their page, in
+    the same ingestion batch, so a page that failed to parse is fetched in
+    full again. Pages are parsed by the extractor of their store
+    (`products.extractors`) in a pool of `parse_workers` processes, or
+    inline with 0.
+
+    Each run is recorded as a `CrawlRun` with per-store stats
+    (`products.metrics`) unless `record` is False.
+    """
+
+    def __init__(
+        self,
+        max_connections=None,
+        per_store=None,
+        timeout=None,
+        batch_size=None,
+        user_agent=None,
+        all_products=False,
+        parse_workers=None,
+        product_ids=None,
+        task=None,
+        record=True,
+        use_copy=None,
+    ):
+        self.max_connections = max_connections or settings.CRAWLER_MAX_CONNECTIONS
+        self.per_store = per_store or settings.CRAWLER_PER_STORE_CONCURRENCY
+        self.timeout = timeout or settings.CRAWLER_TIMEOUT
+        self.batch_size = batch_size or settings.CRAWLER_BATCH_SIZE
+        self.user_agent = user_agent or settings.CRAWLER_USER_AGENT
+        self.all_products = all_products
+        self.product_ids = product_ids
+        self.task = task
+        self.record = record
+        self.parse_workers = settings.CRAWLER_PARSE_WORKERS if parse_workers is None else parse_workers
+        self.parse_pool = None
+        self.stats = CrawlStats()
+        use_copy = settings.CRAWLER_USE_COPY if use_copy is None else use_copy
+        self.ingestor = PriceIngestor(chunk_size=self.batch_size, use_copy=use_copy)
+        self.checked = set()
+        self.changed = set()
+        self.failed = set()
+        self.limiters = {}
+        self.store_stats = {}
+        self.product_stores = {}
+        self.write_seconds = 0
+
+    def run(self, stores):
+        run = start_run(worker_name(), self.task) if self.record else None
+        status = CrawlRun.FAILED
+        try:
+            asyncio.run(self.crawl(stores))
+            reschedule(self.checked, self.changed)
+            retry(self.failed)
+            status = CrawlRun.FINISHED
+        finally:
+            if run is not None:
+                finish_run(run, self.store_stats.values(), self.write_seconds, status)
+        return self.stats
+
+    async def crawl(self, stores):
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+        )
+        client = httpx.AsyncClient(
+            limits=limits,
+            timeout=self.timeout,
+            headers={'User-Agent': self.user_agent},
+            follow_redirects=True,
+        )
+        queue = asyncio.Queue(maxsize=self.batch_size * 2)
+        if self.parse_workers:
+            self.parse_pool = ProcessPoolExecutor(self.parse_workers, initializer=autodiscover)
+        try:
+            async with client:
+                writer = asyncio.create_task(self.write(queue))
+                await asyncio.gather(*(self.crawl_store(client, store, queue) for store in stores))
+                await queue.put(None)
+                await writer
+        finally:
+            if self.parse_pool:
+                self.parse_pool.shutdown()
+                self.parse_pool = None
+
+    def get_limiter(self, store):
+        rate = store.requests_per_second or settings.CRAWLER_REQUESTS_PER_SECOND
+        if not rate:
+            return None
+        host = urlsplit(store.base_url).hostname
+        if host not in self.limiters:
+            self.limiters[host] = TokenBucket(rate)
+        return self.limiters[host]
+
+    async def crawl_store(self, client, store, queue):
+        products = Product.objects.filter(store=store).order_by('id')
+        if self.product_ids is not None:
+            products = products.filter(id__in=self.product_ids)
+        elif not self.all_products:
+            products = due_products(store)
+        products = await sync_to_async(list)(
+            products.values_list('id', 'link', 'http_etag', 'http_last_modified')
+        )
+        stats = self.store_stats[store.pk] = StoreStats(store)
+        stats.products = len(products)
+        self.product_stores.update((product[0], stats) for product in products)
+        pending = iter(products)
+        limiter = self.get_limiter(store)
+        headers = {'User-Agent': store.user_agent} if store.user_agent else {}
+        workers = min(store.crawl_concurrency or self.per_store, len(products))
+        await asyncio.gather(*(
+            self.worker(client, store.shortname, stats, pending, queue, limiter, headers) for _ in range(workers)
+        ))
+
+    async def worker(self, client, shortname, stats, pending, queue, limiter, headers):
+        # All the workers of a store share the same iterator, so each product
+        # is fetched once and at most `per_store` requests are in flight.
+        for product_id, link, etag, last_modified in pending:
+            if limiter:
+                await limiter.acquire()
+            price, validators = await self.fetch(
+                client, shortname, stats, product_id, link, headers, etag, last_modified,
+            )
+            if price is not None:
+                await queue.put((product_id, price, timezone.now(), validators))
+            if product_id not in self.checked:
+                self.failed.add(product_id)
+
+    async def fetch(self, client, shortname, stats, product_id, link, headers, etag='', last_modified=''):
+        """
+        Return the price of the page, or None, and its new validators, or
+        None when they did not change. The product is added to `checked`
+        on a 304 or when a price was extracted.
+        """
+        headers = dict(headers)
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        started = time.perf_counter()
+        try:
+            response = await client.get(link, headers=headers)
+            stats.add_fetch(time.perf_counter() - started, response.num_bytes_downloaded)
+            if response.status_code == 304:
+                self.stats.not_modified += 1
+                stats.not_modified += 1
+                self.checked.add(product_id)
+                return None, None
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.stats.failed += 1
+            stats.failed += 1
+            return None, None
+        self.stats.fetched += 1
+        stats.pages += 1
+
+        try:
+            price, seconds = await self.parse(shortname, response.text)
+        except Exception:
+            # A malformed page must not abort the crawl of every store.
+            self.stats.unparsed += 1
+            stats.parse_failures += 1
+            return None, None
+        stats.add_parse(seconds)
+        if price is None:
+            self.stats.unparsed += 1
+            stats.parse_failures += 1
+            return None, None
+
+        self.checked.add(product_id)
+        validators = (response.headers.get('ETag', '')[:200], response.headers.get('Last-Modified', '')[:100])
+        return price, validators if validators != (etag, last_modified) else None
+
+    async def parse(self, shortname, html):
+        if self.parse_pool is None:
+            return timed_extract_price(shortname, html)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.parse_pool, timed_extract_price, shortname, html,
+        )
+
+    async def write(self, queue):
+        batch = []
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                await sync_to_async(self.ingest)(batch)
+                batch = []
+        await sync_to_async(self.ingest)(batch, flush=True)
+
+    def ingest(self, batch, flush=False):
+        close_old_connections()
+        started = time.perf_counter()
+        rows = self.ingestor.add_many((product_id, price, date) for product_id, price, date, _ in batch)
+        if flush:
+            rows += self.ingestor.flush()
+        for row in rows:
+            self.changed.add(row.product_id)
+            self.product_stores[row.product_id].add_row(row)
+        self.stats.written = self.ingestor.written
+        self.stats.unchanged = self.ingestor.skipped
+
+        # Saved once the prices of their pages are written (the batch size is
+        # the ingestor chunk size), never before.
+        products = [
+            Product(pk=product_id, http_etag=validators[0], http_last_modified=validators[1])
+            for product_id, _, _, validators in batch if validators
+        ]
+        Product.objects.bulk_update(products, ['http_etag', 'http_last_modified'], batch_size=self.batch_size)
+        self.write_seconds += time.perf_counter() - started
+
+
+def enabled_stores(shortnames=None):
+    stores = Store.objects.filter(enabled=True)
+    if shortnames:
+        stores = stores.filter(shortname__in=shortnames)
+    return list(stores.order_by('id'))
@@ -0,0 +1,74 @@
+"""
+psycopg2 connection pool of the COPY ingestion path.
+
+Django keeps one connection per thread, which long-running workers hold for
+their whole life. Only the COPY writes of `PriceIngestor` (the crawler's by
+default, `CRAWLER_USE_COPY`) borrow a connection from this pool: it is
+checked (with `CONN_HEALTH_CHECKS`), used for one transaction and handed
+back, so the workers of a process share a few warm connections. Everything
+else, ORM queries included, goes through the Django connections.
+"""
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from django.conf import settings
+from django.db import connections
+from psycopg2.pool import ThreadedConnectionPool
+
+
+_pool = None
+_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _lock:
+        if _pool is None or _pool.closed:
+            params = connections['default'].get_connection_params()
+            _pool = ThreadedConnectionPool(settings.DB_POOL_MIN_SIZE, settings.DB_POOL_MAX_SIZE, **params)
+        return _pool
+
+
+def close_pool():
+    global _pool
+    with _lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+
+
+def is_usable(conn):
+    if conn.closed:
+        return False
+    if not settings.DATABASES['default'].get('CONN_HEALTH_CHECKS'):
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        conn.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrow a connection for one transaction, committed when the block exits
+    without error and rolled back otherwise.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    if not is_usable(conn):
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
@@ -0,0 +1,272 @@
+"""
+Bulk discovery of the products of a store from its sitemap or product feed.
+
+Sources are streamed (over HTTP or from a file, gzipped or not) and parsed
+with `lxml.etree.iterparse`, clearing every entry once read, so memory does
+not grow with the size of the catalog. Entries are upserted every
+`batch_size` products with one `bulk_create(update_conflicts=True)` on the
+`(store, sku)` constraint instead of a `get_or_create` per product.
+
+Understood formats:
+
+- Sitemap index: the sitemaps it lists are read in turn, each once.
+- Sitemap (`<urlset>`): the SKU is read from each URL by the store
+  extractor (`Extractor.sku_from_url`), URLs without one are skipped, as
+  are all of them for stores without a registered extractor. New
+  products are named after the SKU, only the link of existing ones is
+  updated.
+- Product feed, RSS `<item>` or Atom `<entry>` with the Google Merchant
+  fields (`g:id`, `g:title`, `g:brand`, `g:mpn`, `g:link`, `g:image_link`,
+  `g:product_type`, `g:price`, `g:sale_price`): every field is updated and
+  the feed prices are recorded through `PriceIngestor`.
+
+New products have no `next_check_at`, so the next crawl checks them.
+"""
+import gzip
+import io
+from urllib.parse import unquote, urljoin
+
+import httpx
+from django.conf import settings
+from lxml import etree
+
+from core.routers import use_primary
+
+from .cache import invalidate_products
+from .extractors import get_extractor, to_float
+from .ingestion import PriceIngestor
+from .matching import get_match_key
+from .models import Product
+
+
+ENTRY_TAGS = {'sitemap', 'url', 'item', 'entry'}
+GOOGLE_NS = 'http://base.google.com/ns/1.0'
+SITEMAP_FIELDS = ['link']
+FEED_FIELDS = ['name', 'brand', 'model', 'link', 'image', 'categories', 'match_key']
+
+
+class DiscoveryStats:
+
+    def __init__(self):
+        self.sources = 0
+        self.entries = 0
+        self.skipped = 0
+        self.upserted = 0
+        self.created = 0
+        self.prices = 0
+
+    def __str__(self):
+        return (f'sources={self.sources} entries={self.entries} skipped={self.skipped} '
+                f'upserted={self.upserted} created={self.created} prices={self.prices}')
+
+
+class ChunksReader(io.RawIOBase):
+    """
+    File object over an iterator of bytes, e.g. an HTTP response body.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer:
+            self.buffer = next(self.chunks, b'')
+            if not self.buffer:
+                return 0
+        size = min(len(b), len(self.buffer))
+        b[:size], self.buffer = self.buffer[:size], self.buffer[size:]
+        return size
+
+
+def decompress(stream):
+    """
+    Return `stream` (a buffered reader), ungzipped if it starts with the
+    gzip magic number, whatever the URL or the Content-Type say.
+    """
+    if stream.peek(2)[:2] == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def localname(element):
+    return etree.QName(element).localname
+
+
+def children(element):
+    """
+    Text of the direct children of `element` by local name, `image:image`
+    blocks of sitemaps are flattened to `image_loc`. Google Merchant fields
+    win over the RSS/Atom ones of the same name (`g:link` over `link`).
+    """
+    fields = {}
+    for child in element:
+        if not isinstance(child.tag, str):
+            continue
+        name = localname(child)
+        if name == 'image':
+            loc = next((c.text for c in child if isinstance(c.tag, str) and localname(c) == 'loc'), None)
+            fields.setdefault('image_loc', (loc or '').strip())
+        elif name == 'link' and child.get('href'):
+            fields.setdefault('link', child.get('href'))
+        elif etree.QName(child).namespace == GOOGLE_NS:
+            fields[name] = (child.text or '').strip()
+        else:
+            fields.setdefault(name, (child.text or '').strip())
+    return fields
+
+
+class Discovery:
+    """
+    Read the sitemaps and feeds of `store` and upsert its products.
+    """
+
+    def __init__(self, store, batch_size=None, prices=True, timeout=None):
+        self.store = store
+        self.batch_size = batch_size or settings.DISCOVERY_BATCH_SIZE
+        self.prices = prices
+        self.timeout = timeout or settings.CRAWLER_TIMEOUT
+        self.extractor = get_extractor(store.shortname)
+        self.stats = DiscoveryStats()
+        self.ingestor = PriceIngestor(chunk_size=self.batch_size)
+        self.client = None
+        # Pending products by update fields, and feed prices by SKU.
+        self.pending = {}
+        self.pending_prices = {}
+
+    def default_source(self):
+        return self.store.discovery_url or urljoin(self.store.base_url, '/sitemap.xml')
+
+    def run(self, sources=None):
+        sources = list(sources or [self.default_source()])
+        headers = {'User-Agent': self.store.user_agent or settings.CRAWLER_USER_AGENT}
+        before = Product.objects.filter(store=self.store).count()
+        visited = set()
+        with httpx.Client(timeout=self.timeout, headers=headers, follow_redirects=True) as self.client:
+            while sources:
+                source = sources.pop(0)
+                # Sitemap indexes can list themselves or each other.
+                if source in visited:
+                    continue
+                visited.add(source)
+                sources += self.read(source)
+        for fields in list(self.pending):
+            self.upsert(fields)
+        self.ingestor.flush()
+        self.stats.prices = self.ingestor.written
+        self.stats.created = Product.objects.filter(store=self.store).count() - before
+        invalidate_products()
+        return self.stats
+
+    def read(self, source):
+        """
+        Upsert the products of one sitemap or feed and return the sitemaps
+        it lists.
+        """
+        self.stats.sources += 1
+        if source.startswith(('http://', 'https://')):
+            with self.client.stream('GET', source) as response:
+                response.raise_for_status()
+                return self.parse(io.BufferedReader(ChunksReader(response.iter_bytes())))
+        with open(source, 'rb') as stream:
+            return self.parse(stream)
+
+    def parse(self, stream):
+        sitemaps = []
+        events = etree.iterparse(
+            decompress(stream), events=('end',), resolve_entities=False, no_network=True, huge_tree=True,
+        )
+        for _, element in events:
+            if not isinstance(element.tag, str) or localname(element) not in ENTRY_TAGS:
+                continue
+            fields = children(element)
+            if localname(element) == 'sitemap':
+                if fields.get('loc'):
+                    sitemaps.append(fields['loc'])
+            else:
+                self.add(localname(element), fields)
+            # Drop the entry and the ones before it, only the root is kept.
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        return sitemaps
+
+    def add(self, kind, fields):
+        self.stats.entries += 1
+        if kind == 'url':
+            product, update_fields = self.from_sitemap(fields), SITEMAP_FIELDS
+        else:
+            product, update_fields = self.from_feed(fields), FEED_FIELDS
+        if product is None:
+            self.stats.skipped += 1
+            return
+        key = tuple(update_fields)
+        # Keyed by SKU: a product can only be upserted once per statement.
+        self.pending.setdefault(key, {})[product.sku] = product
+        if len(self.pending[key]) >= self.batch_size:
+            self.upsert(key)
+
+    def from_sitemap(self, fields):
+        link = fields.get('loc', '')
+        sku = self.extractor.sku_from_url(link) if link else None
+        if not sku:
+            return None
+        sku = unquote(sku)
+        name = sku.replace('-', ' ').replace('_', ' ')
+        return self.make_product(sku=sku, name=name, link=link, image=fields.get('image_loc', ''))
+
+    def from_feed(self, fields):
+        sku = fields.get('id') or fields.get('sku')
+        link = fields.get('link', '')
+        if not sku or not link:
+            return None
+        price = to_float(fields.get('sale_price') or fields.get('price') or '')
+        if price is not None:
+            self.pending_prices[sku[:100]] = price
+        return self.make_product(
+            sku=sku,
+            name=fields.get('title', sku),
+            brand=fields.get('brand', ''),
+            model=fields.get('mpn') or None,
+            link=link,
+            image=fields.get('image_link', ''),
+            categories=[c.strip()[:255] for c in fields.get('product_type', '').split('>') if c.strip()],
+        )
+
+    def make_product(self, sku, name, link, image='', brand='', model=None, categories=None):
+        sku, brand, model = sku[:100], brand[:100], model[:100] if model else None
+        return Product(
+            store=self.store,
+            sku=sku,
+            name=name[:200],
+            brand=brand,
+            model=model,
+            link=link[:500],
+            image=image[:500],
+            categories=categories or [],
+            # bulk_create() does not call save().
+            match_key=get_match_key(brand, model, sku),
+        )
+
+    @use_primary()
+    def upsert(self, key):
+        products = list(self.pending.pop(key).values())
+        if not products:
+            return
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['store', 'sku'],
+            update_fields=list(key),
+        )
+        self.stats.upserted += len(products)
+        if self.prices:
+            self.ingestor.add_many(
+                (product.pk, self.pending_prices[product.sku], None)
+                for product in products if product.sku in self.pending_prices
+            )
+        for product in products:
+            self.pending_prices.pop(product.sku, None)
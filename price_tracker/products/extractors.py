@@ -0,0 +1,199 @@
+"""
+Price extractors, one per store.
+
+`get_extractor(shortname)` returns the extractor registered for a store with
+`@register(shortname)` in a module of `products.stores`, or the generic
+`Extractor`. Extractors try the cheap
+paths first: JSON-LD, price meta tags and embedded JSON found with regular
+expressions, and only then parse HTML with lxml, restricted to the fragment
+that follows `price_marker` instead of the whole document. `sku_from_url()`
+reads the SKU of the product URLs of a store sitemap (`products.discovery`).
+A store only overrides what differs, e.g.:
+
+    @register('mystore')
+    class MyStoreExtractor(Extractor):
+        price_marker = 'class="product-price"'
+        price_xpath = './/span[@class="product-price"]'
+        sitemap_sku_re = re.compile(r'/p/(?P<sku>\d+)')
+
+The module does not use Django, so `extract_price()` can run in the worker
+processes of the crawler, which call `autodiscover()` when they start.
+"""
+import importlib
+import json
+import pkgutil
+import re
+import time
+
+import lxml.html
+from lxml.etree import ParserError
+
+
+JSON_LD_RE = re.compile(
+    r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL,
+)
+META_PRICE_RE = [
+    re.compile(r'<meta[^>]+(?:itemprop|property)=["\'](?:price|product:price:amount|og:price:amount)["\'][^>]+content=["\']([^"\']+)["\']', re.IGNORECASE),
+    re.compile(r'<meta[^>]+content=["\']([^"\']+)["\'][^>]+(?:itemprop|property)=["\'](?:price|product:price:amount|og:price:amount)["\']', re.IGNORECASE),
+]
+JSON_PRICE_RE = re.compile(r'"price"\s*:\s*"?([\d.,]*\d)')
+
+
+def to_float(value):
+    """
+    Convert a price text like `1,299.00`, `1.299,00` or `$ 899` to a float.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = re.sub(r'[^\d.,]', '', str(value))
+    if not text:
+        return None
+    if ',' in text and '.' in text:
+        # The right-most separator is the decimal one.
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        head, _, tail = text.rpartition(',')
+        text = f'{head.replace(",", "")}.{tail}' if len(tail) == 2 else text.replace(',', '')
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _json_ld_price(data):
+    if isinstance(data, list):
+        for item in data:
+            price = _json_ld_price(item)
+            if price is not None:
+                return price
+        return None
+    if not isinstance(data, dict):
+        return None
+    if '@graph' in data:
+        return _json_ld_price(data['@graph'])
+    offers = data.get('offers')
+    if isinstance(offers, list):
+        offers = offers[0] if offers else None
+    if isinstance(offers, dict):
+        price = offers.get('price', offers.get('lowPrice'))
+        if price is not None:
+            return to_float(price)
+    return None
+
+
+EXTRACTORS = {}
+
+
+def register(shortname):
+    def decorator(cls):
+        EXTRACTORS[shortname] = cls()
+        return cls
+    return decorator
+
+
+def autodiscover():
+    """
+    Import every module of `products.stores`, registering their extractors.
+    """
+    from . import stores
+    for module in pkgutil.iter_modules(stores.__path__):
+        importlib.import_module(f'{stores.__name__}.{module.name}')
+
+
+class Extractor:
+    # Paths to try, cheapest first; set one to None to skip it.
+    json_ld_re = JSON_LD_RE
+    meta_price_re = META_PRICE_RE
+    json_price_re = JSON_PRICE_RE
+    # Text found in (or right before) the price element, and the price
+    # element within the fragment that starts there.
+    price_marker = 'itemprop="price"'
+    price_xpath = 'descendant-or-self::*[@itemprop="price"]'
+    fragment_size = 2000
+    # SKU in the product URLs of a sitemap (group `sku`); other URLs, like
+    # categories, are not products. Only stores with their own extractor
+    # know their URLs, the generic one reads no product from a sitemap.
+    sitemap_sku_re = None
+
+    def extract(self, html):
+        for method in (self.from_json_ld, self.from_meta, self.from_embedded_json, self.from_html):
+            price = method(html)
+            if price is not None:
+                return price
+        return None
+
+    def from_json_ld(self, html):
+        if self.json_ld_re is None:
+            return None
+        for block in self.json_ld_re.findall(html):
+            try:
+                price = _json_ld_price(json.loads(block))
+            except ValueError:
+                continue
+            if price is not None:
+                return price
+        return None
+
+    def from_meta(self, html):
+        for pattern in self.meta_price_re or []:
+            match = pattern.search(html)
+            if match:
+                price = to_float(match.group(1))
+                if price is not None:
+                    return price
+        return None
+
+    def from_embedded_json(self, html):
+        if self.json_price_re is None:
+            return None
+        match = self.json_price_re.search(html)
+        return to_float(match.group(1)) if match else None
+
+    def from_html(self, html):
+        if not self.price_xpath:
+            return None
+        if self.price_marker:
+            index = html.find(self.price_marker)
+            if index < 0:
+                return None
+            start = html.rfind('<', 0, index)
+            html = html[start:start + self.fragment_size]
+        try:
+            root = lxml.html.fragment_fromstring(html, create_parent='div')
+        except (ParserError, ValueError):
+            return None
+        for element in root.xpath(self.price_xpath):
+            price = to_float(element.get('content') or element.text_content())
+            if price is not None:
+                return price
+        return None
+
+    def sku_from_url(self, url):
+        if self.sitemap_sku_re is None:
+            return None
+        match = self.sitemap_sku_re.search(url)
+        return match.group('sku') if match else None
+
+
+DEFAULT_EXTRACTOR = Extractor()
+
+
+def get_extractor(shortname):
+    return EXTRACTORS.get(shortname, DEFAULT_EXTRACTOR)
+
+
+def extract_price(shortname, html):
+    return get_extractor(shortname).extract(html)
+
+
+def timed_extract_price(shortname, html):
+    """
+    `extract_price()` and the seconds it took, measured where it ran.
+    """
+    started = time.perf_counter()
+    price = extract_price(shortname, html)
+    return price, time.perf_counter() - started
@@ -0,0 +1,36 @@
+from django import forms
+
+from .models import Watch
+
+
+attr_class_form = 'form-control h-auto form-control-solid'
+
+
+class WatchForm(forms.ModelForm):
+    target_price = forms.FloatField(
+        widget=forms.NumberInput(attrs={'class': attr_class_form, 'placeholder': 'Precio objetivo', 'step': '0.01'}),
+        label='',
+        required=False,
+        min_value=0,
+    )
+    drop_rate = forms.FloatField(
+        widget=forms.NumberInput(attrs={'class': attr_class_form, 'placeholder': '% de descuento', 'step': '1'}),
+        label='',
+        required=False,
+        min_value=1,
+        max_value=99,
+    )
+
+    error_messages = {
+        "empty": "Ingresa un precio objetivo o un porcentaje de descuento.",
+    }
+
+    class Meta:
+        model = Watch
+        fields = ['target_price', 'drop_rate']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('target_price') is None and cleaned_data.get('drop_rate') is None:
+            raise forms.ValidationError(self.error_messages["empty"], code="empty")
+        return cleaned_data
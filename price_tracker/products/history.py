@@ -0,0 +1,234 @@
+import datetime
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Avg, Count, DateField, F, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import ProductHistory, ProductPriceDaily, ProductPriceWeekly
+from .rollups import get_watermark
+
+
+MAX_POINTS = 300
+
+BUCKETS = [
+    ('hour', datetime.timedelta(hours=1)),
+    ('day', datetime.timedelta(days=1)),
+    ('week', datetime.timedelta(weeks=1)),
+    ('month', datetime.timedelta(days=31)),
+]
+
+# bucket kind -> (rollup model, truncation of its dates)
+ROLLUPS = {
+    'day': (ProductPriceDaily, None),
+    'week': (ProductPriceWeekly, None),
+    'month': (ProductPriceDaily, 'month'),
+}
+
+
+class LastValue(ArrayAgg):
+    """
+    Value of the first row of each group according to `ordering`.
+    """
+    template = '(%(function)s(%(expressions)s %(ordering)s))[1]'
+
+    @property
+    def output_field(self):
+        return self.source_expressions[0].output_field
+
+
+def choose_bucket(start, end, max_points=MAX_POINTS):
+    span = end - start
+    for kind, size in BUCKETS:
+        if span / size <= max_points:
+            return kind
+    return BUCKETS[-1][0]
+
+
+def price_series(product, since=None, max_points=MAX_POINTS, method='bucket'):
+    """
+    Return the price history of `product` with at most about `max_points`
+    points, as dicts with `date`, `min`, `max`, `avg` and `last` price.
+
+    Short histories are returned as they are. Longer ones are aggregated by
+    hour, day, week or month buckets; day and longer buckets are read from
+    the rollup tables plus the history rows not rolled up yet, so the first
+    bucket may include prices from before `since`. With
+    `method='lttb'` the raw history is reduced with `lttb()` instead.
+
+    Prices are only written when they change, so with `since` the last
+    price before it is carried forward as the first point, at `since`:
+    a product whose price did not move in the period still has a series.
+    """
+    series = _price_series(product, since, max_points, method)
+    if since is None:
+        return series
+    carried = price_before(product, since)
+    if carried is None:
+        return series
+    if series:
+        first = series[0]['date']
+        if isinstance(first, datetime.datetime):
+            start = since
+        else:
+            # Day, week or month bucket, it starts before `since` if it holds it.
+            start = timezone.localdate(since)
+        if first <= start:
+            return series
+    else:
+        start = since
+    point = {'date': start, 'min': carried, 'max': carried, 'avg': carried, 'last': carried}
+    return [point, *series]
+
+
+def price_before(product, since):
+    """
+    Price of `product` right before `since`, from the history or, when it
+    was compacted, from the daily rollups.
+    """
+    candidates = [
+        ProductHistory.objects.filter(product=product, date__lt=since)
+        .order_by('-date').values_list('date', 'price').first(),
+        ProductPriceDaily.objects.filter(product=product, last_date__lt=since)
+        .order_by('-last_date').values_list('last_date', 'close').first(),
+    ]
+    candidates = [candidate for candidate in candidates if candidate is not None]
+    return max(candidates)[1] if candidates else None
+
+
+def _price_series(product, since, max_points, method):
+    history = ProductHistory.objects.filter(product=product)
+    rolled = ProductPriceDaily.objects.filter(product=product)
+    if since is not None:
+        history = history.filter(date__gte=since)
+        rolled = rolled.filter(last_date__gte=since)
+
+    summary = history.aggregate(count=Count('id'), start=Min('date'), end=Max('date'))
+    rolled_summary = rolled.aggregate(start=Min('first_date'), end=Max('last_date'))
+    dates = [date for date in (summary['start'], rolled_summary['start']) if date is not None]
+    if not dates:
+        return []
+
+    # Raw rows are enough unless older history was compacted into rollups.
+    complete = summary['start'] is not None and (
+        rolled_summary['start'] is None or rolled_summary['start'] >= summary['start']
+    )
+    if method == 'lttb' or (complete and summary['count'] <= max_points):
+        points = list(history.order_by('date').values_list('date', 'price'))
+        if method == 'lttb':
+            points = lttb(points, max_points)
+        return [
+            {'date': date, 'min': price, 'max': price, 'avg': price, 'last': price}
+            for date, price in points
+        ]
+
+    end = max(date for date in (summary['end'], rolled_summary['end']) if date is not None)
+    kind = choose_bucket(min(dates), end, max_points)
+    if kind not in ROLLUPS:
+        return [
+            {'date': bucket, 'min': low, 'max': high, 'avg': mean, 'last': last}
+            for bucket, low, high, mean, last, _ in aggregate_history(history, kind)
+        ]
+
+    buckets = {}
+    watermark = get_watermark()
+    rows = list(rollup_buckets(product, kind, since))
+    rows += aggregate_history(history.filter(id__gt=watermark), kind, output_field=DateField())
+    for bucket, low, high, mean, last, count in rows:
+        if bucket in buckets:
+            merged = buckets[bucket]
+            total = merged['count'] + count
+            merged['avg'] = (merged['avg'] * merged['count'] + mean * count) / total
+            merged['min'] = min(merged['min'], low)
+            merged['max'] = max(merged['max'], high)
+            merged['last'] = last
+            merged['count'] = total
+        else:
+            buckets[bucket] = {'date': bucket, 'min': low, 'max': high, 'avg': mean, 'last': last, 'count': count}
+    return [
+        {key: value for key, value in point.items() if key != 'count'}
+        for _, point in sorted(buckets.items())
+    ]
+
+
+def aggregate_history(history, kind, output_field=None):
+    """
+    `(bucket, min, max, avg, last, count)` of the `history` rows by `kind` bucket.
+    """
+    return (
+        history.annotate(bucket=Trunc('date', kind, output_field=output_field))
+        .values('bucket')
+        .annotate(
+            low=Min('price'),
+            high=Max('price'),
+            mean=Avg('price'),
+            last=LastValue('price', ordering='-date'),
+            samples=Count('id'),
+        )
+        .order_by('bucket')
+        .values_list('bucket', 'low', 'high', 'mean', 'last', 'samples')
+    )
+
+
+def rollup_buckets(product, kind, since=None):
+    """
+    `(bucket, min, max, avg, last, count)` of `product` from the rollup tables.
+    """
+    model, trunc = ROLLUPS[kind]
+    rows = model.objects.filter(product=product)
+    if since is not None:
+        rows = rows.filter(last_date__gte=since)
+    if trunc is None:
+        return rows.order_by('date').values_list('date', 'min', 'max', 'avg', 'close', 'count')
+    return (
+        rows.annotate(bucket=Trunc('date', trunc))
+        .values('bucket')
+        .annotate(
+            low=Min('min'),
+            high=Max('max'),
+            mean=Sum(F('avg') * F('count')) / Sum('count'),
+            last=LastValue('close', ordering='-date'),
+            samples=Sum('count'),
+        )
+        .order_by('bucket')
+        .values_list('bucket', 'low', 'high', 'mean', 'last', 'samples')
+    )
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling of `(date, price)` points,
+    which keeps the visual shape of the series (peaks and drops) with
+    `threshold` points.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return points
+
+    xs = [date.timestamp() for date, _ in points]
+    ys = [price for _, price in points]
+    sampled = [points[0]]
+    size = (len(points) - 2) / (threshold - 2)
+    selected = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket, the third point of the triangle.
+        start = int((i + 1) * size) + 1
+        end = min(int((i + 2) * size) + 1, len(points))
+        avg_x = sum(xs[start:end]) / (end - start)
+        avg_y = sum(ys[start:end]) / (end - start)
+
+        best_area = -1
+        best = start
+        for j in range(int(i * size) + 1, start):
+            area = abs(
+                (xs[selected] - avg_x) * (ys[j] - ys[selected])
+                - (xs[selected] - xs[j]) * (avg_y - ys[selected])
+            )
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled.append(points[best])
+        selected = best
+
+    sampled.append(points[-1])
+    return sampled
@@ -0,0 +1,201 @@
+import csv
+import io
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from psycopg2.extras import execute_values
+
+from core.routers import use_primary
+
+from .alerts import evaluate_alerts
+from .cache import invalidate_products
+from .db import pooled_connection
+from .models import ProductHistory, ProductLatestPrice
+
+
+def get_discount_rate(last_price, price):
+    if not last_price:
+        return None
+    return round((last_price - price) / last_price * 100, 2)
+
+
+class PriceIngestor:
+    """
+    Single entry point for price observations going into `ProductHistory`.
+
+    Observations are buffered and written every `chunk_size` rows with
+    `bulk_create`, or with Postgres `COPY` on a connection of the worker
+    pool (`products.db`) when `use_copy` is set. The last
+    known price of each product is kept in memory, so `last_price` and
+    `discount_rate` are filled without a query per product and observations
+    that do not change the price are skipped.
+
+    Each flush also updates the `ProductLatestPrice` snapshot of the written
+    products in the same transaction, then invalidates their cached pages
+    and evaluates their price alerts.
+    """
+
+    def __init__(self, chunk_size=None, use_copy=None, skip_unchanged=True, alerts=True):
+        self.chunk_size = chunk_size or settings.INGESTION_CHUNK_SIZE
+        self.use_copy = settings.INGESTION_USE_COPY if use_copy is None else use_copy
+        self.skip_unchanged = skip_unchanged
+        self.alerts = alerts
+        self.last_prices = {}
+        self.pending = []
+        self.written = 0
+        self.skipped = 0
+
+    def add(self, product_id, price, date=None):
+        self.pending.append((product_id, price, date or timezone.now()))
+        if len(self.pending) >= self.chunk_size:
+            return self.flush()
+        return []
+
+    def add_many(self, observations):
+        rows = []
+        for product_id, price, date in observations:
+            rows += self.add(product_id, price, date)
+        return rows
+
+    @use_primary()
+    def flush(self):
+        """
+        Write the buffered observations and return the created rows. Reads
+        stay on the primary, a replica may not have the last writes yet.
+        """
+        observations, self.pending = self.pending, []
+        if not observations:
+            return []
+        self.load_last_prices({product_id for product_id, _, _ in observations})
+
+        rows = []
+        for product_id, price, date in observations:
+            last_price = self.last_prices.get(product_id)
+            if last_price == price and self.skip_unchanged:
+                self.skipped += 1
+                continue
+            if last_price is None:
+                last_price = price
+            rows.append(ProductHistory(
+                product_id=product_id,
+                price=price,
+                last_price=last_price,
+                discount_rate=get_discount_rate(last_price, price),
+                date=date,
+            ))
+            self.last_prices[product_id] = price
+
+        if rows:
+            product_ids = {row.product_id for row in rows}
+            if self.use_copy and connection.vendor == 'postgresql':
+                self.copy(rows)
+                invalidate_products(product_ids)
+            else:
+                with transaction.atomic():
+                    ProductHistory.objects.bulk_create(rows, batch_size=self.chunk_size)
+                    self.update_latest(rows)
+                    transaction.on_commit(partial(invalidate_products, product_ids))
+            self.written += len(rows)
+            if self.alerts:
+                evaluate_alerts(product_ids)
+        return rows
+
+    def load_last_prices(self, product_ids):
+        missing = [pk for pk in product_ids if pk not in self.last_prices]
+        if not missing:
+            return
+        self.last_prices.update(
+            ProductLatestPrice.objects.filter(product_id__in=missing).values_list('product_id', 'price')
+        )
+        # Products without snapshot, e.g. before `rebuild_latest_prices` ran.
+        missing = [pk for pk in missing if pk not in self.last_prices]
+        if not missing:
+            return
+        latest = (
+            ProductHistory.objects.filter(product_id__in=missing)
+            .order_by('product_id', '-date')
+            .distinct('product_id')
+            .values_list('product_id', 'price')
+        )
+        self.last_prices.update(latest)
+
+    def update_latest(self, rows):
+        latest = {}
+        for row in rows:
+            latest[row.product_id] = ProductLatestPrice(
+                product_id=row.product_id,
+                price=row.price,
+                last_price=row.last_price,
+                discount_rate=row.discount_rate or 0,
+                date=row.date,
+            )
+        ProductLatestPrice.objects.bulk_create(
+            latest.values(),
+            batch_size=self.chunk_size,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['price', 'last_price', 'discount_rate', 'date'],
+        )
+
+    def copy(self, rows):
+        """
+        `COPY` the rows into the history and upsert the snapshot in one
+        transaction of a pooled connection.
+        """
+        fields = ['product_id', 'price', 'last_price', 'discount_rate', 'date']
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                row.product_id,
+                row.price,
+                row.last_price,
+                '' if row.discount_rate is None else row.discount_rate,
+                row.date.isoformat(),
+            ])
+        buffer.seek(0)
+
+        latest = {row.product_id: row for row in rows}
+        history_table = connection.ops.quote_name(ProductHistory._meta.db_table)
+        latest_table = connection.ops.quote_name(ProductLatestPrice._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(field) for field in fields)
+        with pooled_connection() as conn, conn.cursor() as cursor:
+            cursor.copy_expert(f'COPY {history_table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+            execute_values(
+                cursor,
+                f"""
+                INSERT INTO {latest_table} ({columns}) VALUES %s
+                ON CONFLICT (product_id) DO UPDATE SET
+                    price = EXCLUDED.price,
+                    last_price = EXCLUDED.last_price,
+                    discount_rate = EXCLUDED.discount_rate,
+                    date = EXCLUDED.date
+                """,
+                [
+                    (row.product_id, row.price, row.last_price, row.discount_rate or 0, row.date)
+                    for row in latest.values()
+                ],
+                page_size=self.chunk_size,
+            )
+
+
+def rebuild_latest_prices():
+    """
+    Recompute the whole `ProductLatestPrice` snapshot from `ProductHistory`.
+    """
+    latest = ProductLatestPrice._meta.db_table
+    history = ProductHistory._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {latest}')
+        cursor.execute(
+            f"""
+            INSERT INTO {latest} (product_id, price, last_price, discount_rate, date)
+            SELECT DISTINCT ON (product_id) product_id, price, last_price, COALESCE(discount_rate, 0), date
+            FROM {history}
+            ORDER BY product_id, date DESC
+            """
+        )
+        transaction.on_commit(invalidate_products)
+        return cursor.rowcount
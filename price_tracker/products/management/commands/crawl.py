@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.crawler import Crawler, enabled_stores
+from products.metrics import purge_runs
+
+
+class Command(BaseCommand):
+    help = 'Fetch the current price of the products of the enabled stores that are due for a check.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('stores', nargs='*', help='Store short names (default: all enabled stores).')
+        parser.add_argument('--max-connections', type=int, help='Size of the HTTP connection pool.')
+        parser.add_argument('--concurrency', type=int, help='Concurrent requests per store.')
+        parser.add_argument('--timeout', type=float, help='Request timeout in seconds.')
+        parser.add_argument('--batch-size', type=int, help='ProductHistory rows per INSERT.')
+        parser.add_argument('--parse-workers', type=int, help='Processes parsing pages (0: parse inline).')
+        parser.add_argument('--all', action='store_true', help='Check every product, not only the due ones.')
+
+    def handle(self, *args, **options):
+        stores = enabled_stores(options['stores'])
+        if not stores:
+            raise CommandError('No enabled stores to crawl.')
+
+        crawler = Crawler(
+            max_connections=options['max_connections'],
+            per_store=options['concurrency'],
+            timeout=options['timeout'],
+            batch_size=options['batch_size'],
+            all_products=options['all'],
+            parse_workers=options['parse_workers'],
+        )
+        self.stdout.write(f'Crawling {", ".join(store.shortname for store in stores)}')
+        stats = crawler.run(stores)
+        self.stdout.write(self.style.SUCCESS(f'Crawl finished: {stats}'))
+        purge_runs()
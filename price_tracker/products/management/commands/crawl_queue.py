@@ -0,0 +1,87 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from products import crawl_queue, metrics
+from products.crawler import Crawler, enabled_stores
+
+
+class Command(BaseCommand):
+    help = (
+        'Crawl through the Postgres work queue. `enqueue` queues the due products '
+        '(run it periodically, e.g. every few minutes), `work` crawls leased tasks '
+        '(run as many as needed, on any node) and `status` shows the queue.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['enqueue', 'work', 'status'])
+        parser.add_argument('stores', nargs='*', help='Store short names for enqueue (default: all enabled stores).')
+        parser.add_argument('--all', action='store_true', help='Enqueue every product, not only the due ones.')
+        parser.add_argument('--task-size', type=int, help='Products per task.')
+        parser.add_argument('--worker', default=crawl_queue.worker_name(), help='Worker name (default: host:pid).')
+        parser.add_argument('--once', action='store_true', help='Stop working when the queue is empty.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls of an empty queue (default: 5).')
+        parser.add_argument('--parse-workers', type=int, help='Processes parsing pages (0: parse inline).')
+        parser.add_argument('--minutes', type=int, default=60, help='Throughput window of status (default: 60).')
+
+    def handle(self, *args, **options):
+        getattr(self, options['action'])(options)
+
+    def enqueue(self, options):
+        stores = enabled_stores(options['stores'])
+        if not stores:
+            raise CommandError('No enabled stores to crawl.')
+        purged = crawl_queue.purge()
+        metrics.purge_runs()
+        created = crawl_queue.enqueue(stores, all_products=options['all'], task_size=options['task_size'])
+        self.stdout.write(self.style.SUCCESS(f'{created} tasks queued, {purged} old tasks deleted'))
+
+    def work(self, options):
+        worker = options['worker']
+        while True:
+            close_old_connections()
+            tasks = crawl_queue.lease(worker)
+            if not tasks:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+            for task in tasks:
+                self.run_task(task, worker, options)
+
+    def run_task(self, task, worker, options):
+        keeper = crawl_queue.LeaseKeeper(task, worker)
+        keeper.start()
+        crawler = Crawler(
+            all_products=True,
+            product_ids=task.product_ids,
+            task=task,
+            parse_workers=options['parse_workers'],
+        )
+        try:
+            stats = crawler.run([task.store])
+        except BaseException as exc:
+            keeper.stop()
+            crawl_queue.release(task, worker, error=repr(exc))
+            if not isinstance(exc, Exception):
+                raise
+            self.stderr.write(f'Task {task.pk} ({task.store.shortname}) failed: {exc!r}')
+            return
+        keeper.stop()
+        if keeper.lost or not crawl_queue.complete(task, worker, checked=len(crawler.checked)):
+            self.stderr.write(f'Lost the lease of task {task.pk}')
+        self.stdout.write(f'Task {task.pk} ({task.store.shortname}): {stats}')
+
+    def status(self, options):
+        minutes = options['minutes']
+        rows = crawl_queue.queue_status(minutes)
+        self.stdout.write(
+            f'{"store":20} {"pending":>8} {"leased":>7} {"expired":>8} {"failed":>7} '
+            f'{"done":>6} {"products/min":>13}   (last {minutes} min)'
+        )
+        for row in rows:
+            self.stdout.write(
+                f'{row["store__shortname"]:20} {row["pending"]:8} {row["leased"]:7} {row["expired"]:8} '
+                f'{row["failed"]:7} {row["done"]:6} {row["checked"] / minutes:13.1f}'
+            )
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.discovery import Discovery
+from products.models import Store
+
+
+class Command(BaseCommand):
+    help = 'Create or update the products of a store from its sitemap or product feed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('store', help='Store short name.')
+        parser.add_argument('sources', nargs='*', help='Sitemap or feed URLs or files, gzipped or not (default: the store discovery URL).')
+        parser.add_argument('--batch-size', type=int, help='Products per upsert.')
+        parser.add_argument('--no-prices', action='store_false', dest='prices', help='Do not record the feed prices.')
+
+    def handle(self, *args, **options):
+        try:
+            store = Store.objects.get(shortname=options['store'])
+        except Store.DoesNotExist:
+            raise CommandError(f'Unknown store {options["store"]}.')
+
+        discovery = Discovery(store, batch_size=options['batch_size'], prices=options['prices'])
+        stats = discovery.run(options['sources'])
+        self.stdout.write(self.style.SUCCESS(f'Discovery of {store.shortname} finished: {stats}'))
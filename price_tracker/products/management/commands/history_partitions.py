@@ -0,0 +1,55 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from products import partitions
+
+
+def month(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m').replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        raise CommandError(f'Invalid month "{value}", expected YYYY-MM.')
+
+
+class Command(BaseCommand):
+    help = (
+        'Manage the monthly partitions of ProductHistory. Run it periodically '
+        '(e.g. daily) so the partitions of the coming months exist before rows '
+        'for them arrive.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Convert ProductHistory into a partitioned table.')
+        parser.add_argument('--revert', action='store_true', help='Convert ProductHistory back into a plain table.')
+        parser.add_argument('--ahead', type=int, default=3, help='Months to create in advance (default: 3).')
+        parser.add_argument('--detach-before', type=month, metavar='YYYY-MM',
+                            help='Detach the partitions older than this month, keeping them as standalone tables.')
+        parser.add_argument('--drop-before', type=month, metavar='YYYY-MM',
+                            help='Drop the partitions older than this month.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL.')
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if options['revert']:
+                partitions.unpartition_table(cursor)
+                self.stdout.write(self.style.SUCCESS('ProductHistory is now a plain table.'))
+                return
+            if options['convert']:
+                partitions.partition_table(cursor, options['ahead'])
+            if not partitions.is_partitioned(cursor):
+                raise CommandError('ProductHistory is not partitioned, use --convert first.')
+
+            partitions.ensure_partitions(cursor, options['ahead'])
+            for name, start, rows in partitions.list_partitions(cursor):
+                if start is not None and options['drop_before'] and start < options['drop_before']:
+                    partitions.drop_partition(cursor, name)
+                    self.stdout.write(f'Dropped {name}')
+                elif start is not None and options['detach_before'] and start < options['detach_before']:
+                    partitions.detach_partition(cursor, name)
+                    self.stdout.write(f'Detached {name}')
+                else:
+                    self.stdout.write(f'{name}: ~{rows} rows')
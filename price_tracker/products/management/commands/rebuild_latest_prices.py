@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.ingestion import rebuild_latest_prices
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ProductLatestPrice snapshot from ProductHistory.'
+
+    def handle(self, *args, **options):
+        count = rebuild_latest_prices()
+        self.stdout.write(self.style.SUCCESS(f'{count} latest prices rebuilt.'))
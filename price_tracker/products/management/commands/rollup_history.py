@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.rollups import compact_history, update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge the new ProductHistory rows into the daily and weekly rollups and '
+        'optionally delete the raw rows older than the retention period.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compact-after', type=int, default=settings.HISTORY_RETENTION_DAYS,
+                            help='Delete rolled up history older than this many days (0: keep everything).')
+
+    def handle(self, *args, **options):
+        processed = update_rollups()
+        self.stdout.write(f'{processed} history ids rolled up.')
+        if options['compact_after']:
+            deleted = compact_history(options['compact_after'])
+            self.stdout.write(f'{deleted} history rows compacted.')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from products.alerts import queue_alert_digests
+
+
+class Command(BaseCommand):
+    help = (
+        'Queue one email per user with the price alerts of the finished digest '
+        'windows. Run it once per window, e.g. from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, help='Digest window in minutes.')
+
+    def handle(self, *args, **options):
+        count = queue_alert_digests(options['window'])
+        self.stdout.write(self.style.SUCCESS(f'{count} digests queued.'))
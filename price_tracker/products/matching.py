@@ -0,0 +1,30 @@
+import re
+import unicodedata
+
+
+NON_ALPHANUMERIC_RE = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(value):
+    """
+    Lowercase `value` without accents, spaces or punctuation, so
+    `Samsung Electrónica` and `samsung-electronica` compare equal.
+    """
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode()
+    return NON_ALPHANUMERIC_RE.sub('', value.lower())
+
+
+def get_match_key(brand, model=None, sku=None):
+    """
+    Fingerprint shared by the offers of the same item in different stores:
+    the normalized brand with the model, or with the SKU when the model is
+    unknown. Returns an empty string when there is nothing to match on.
+    """
+    brand = normalize(brand)
+    if normalize(model):
+        return f'{brand}:{normalize(model)}'[:200]
+    if normalize(sku):
+        return f'{brand}:sku:{normalize(sku)}'[:200]
+    return ''
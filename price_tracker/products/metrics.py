@@ -0,0 +1,127 @@
+"""
+Bookkeeping of crawl runs.
+
+The crawler keeps a `StoreStats` per store while it runs: pages, bytes,
+failures, the latency of every request and every parse, and the history
+rows it wrote. `finish_run()` saves them as the `CrawlStoreStats` of the
+`CrawlRun`, with the p50/p95 latencies, so a slow store shows whether the
+time goes to the network, the parsing or the database writes (the write
+time is measured per run, the batches mix stores).
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from core.routers import use_primary
+
+from .models import CrawlRun, CrawlStoreStats
+
+
+COUNTERS = [
+    'products', 'pages', 'bytes', 'failed', 'not_modified', 'parse_failures',
+    'rows_written', 'price_changes', 'fetch_seconds', 'parse_seconds',
+]
+
+
+def percentile(values, q):
+    """
+    Nearest-rank `q` percentile of `values`, None when empty.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+class StoreStats:
+
+    def __init__(self, store):
+        self.store = store
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.fetch_times = []
+        self.parse_times = []
+
+    def add_fetch(self, seconds, size=0):
+        self.fetch_times.append(seconds)
+        self.fetch_seconds += seconds
+        self.bytes += size
+
+    def add_parse(self, seconds):
+        self.parse_times.append(seconds)
+        self.parse_seconds += seconds
+
+    def add_row(self, row):
+        self.rows_written += 1
+        if row.price != row.last_price:
+            self.price_changes += 1
+
+    def to_model(self, run):
+        return CrawlStoreStats(
+            run=run,
+            store=self.store,
+            fetch_p50=percentile(self.fetch_times, 50),
+            fetch_p95=percentile(self.fetch_times, 95),
+            parse_p50=percentile(self.parse_times, 50),
+            parse_p95=percentile(self.parse_times, 95),
+            **{name: getattr(self, name) for name in COUNTERS},
+        )
+
+
+@use_primary()
+def start_run(worker='', task=None):
+    return CrawlRun.objects.create(worker=worker, task=task)
+
+
+@use_primary()
+def finish_run(run, store_stats, write_seconds=0, status=CrawlRun.FINISHED):
+    store_stats = [stats.to_model(run) for stats in store_stats]
+    CrawlStoreStats.objects.bulk_create(store_stats)
+    for name in COUNTERS:
+        setattr(run, name, sum(getattr(stats, name) for stats in store_stats))
+    run.write_seconds = write_seconds
+    run.status = status
+    run.finished_at = timezone.now()
+    run.save()
+    return run
+
+
+def purge_runs(days=None):
+    """
+    Delete the runs started more than `days` ago.
+    """
+    days = days or settings.CRAWL_METRICS_RETENTION_DAYS
+    deleted, _ = CrawlRun.objects.filter(started_at__lt=timezone.now() - datetime.timedelta(days=days)).delete()
+    return deleted
+
+
+def store_summary(since, store=None):
+    """
+    Totals of each store (only of the `store` shortname when given) over the
+    runs started after `since`, with the worst p95 latencies.
+    """
+    rows = CrawlStoreStats.objects.filter(run__started_at__gte=since)
+    if store:
+        rows = rows.filter(store__shortname=store)
+    rows = (
+        rows.values('store__shortname')
+        .annotate(
+            runs=Count('run'),
+            max_fetch_p95=Max('fetch_p95'),
+            max_parse_p95=Max('parse_p95'),
+            **{f'total_{name}': Sum(name) for name in COUNTERS},
+        )
+        .order_by('store__shortname')
+    )
+    return [
+        {
+            'store': row['store__shortname'],
+            'runs': row['runs'],
+            **{name: row[f'total_{name}'] for name in COUNTERS},
+            'fetch_p95': row['max_fetch_p95'],
+            'parse_p95': row['max_parse_p95'],
+        }
+        for row in rows
+    ]
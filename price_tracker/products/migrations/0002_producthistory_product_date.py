@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producthistory',
+            index=models.Index(fields=['product', '-date'], include=('price', 'last_price', 'discount_rate'), name='producthistory_product_date'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations
+
+from products import partitions
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql' or not settings.PRODUCT_HISTORY_PARTITIONED:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        partitions.partition_table(cursor)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        partitions.unpartition_table(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_producthistory_product_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
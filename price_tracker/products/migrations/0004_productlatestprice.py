@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_partition_producthistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductLatestPrice',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest_price', serialize=False, to='products.product')),
+                ('price', models.FloatField(verbose_name='Current Price')),
+                ('last_price', models.FloatField(verbose_name='Last Price')),
+                ('discount_rate', models.FloatField(default=0, verbose_name='Discount Rate')),
+                ('date', models.DateTimeField(verbose_name='Date')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['price', 'product'], name='latestprice_price'), models.Index(fields=['discount_rate', 'product'], name='latestprice_discount')],
+            },
+        ),
+    ]
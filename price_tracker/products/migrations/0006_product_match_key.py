@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+from products.matching import get_match_key
+
+
+def fill_match_keys(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    products = []
+    for product in Product.objects.only('brand', 'model', 'sku').iterator(chunk_size=2000):
+        product.match_key = get_match_key(product.brand, product.model, product.sku)
+        products.append(product)
+        if len(products) >= 2000:
+            Product.objects.bulk_update(products, ['match_key'])
+            products = []
+    Product.objects.bulk_update(products, ['match_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='match_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200, verbose_name='Match Key'),
+        ),
+        migrations.RunPython(fill_match_keys, migrations.RunPython.noop),
+    ]
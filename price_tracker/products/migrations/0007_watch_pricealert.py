@@ -0,0 +1,50 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_match_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_price', models.FloatField(blank=True, null=True, verbose_name='Target Price')),
+                ('drop_rate', models.FloatField(blank=True, help_text='Percentage below the reference price', null=True, verbose_name='Drop Rate')),
+                ('reference_price', models.FloatField(blank=True, null=True, verbose_name='Reference Price')),
+                ('notified_price', models.FloatField(blank=True, null=True, verbose_name='Notified Price')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date Created')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watches', to='products.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watches', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.FloatField(verbose_name='Price')),
+                ('previous_price', models.FloatField(blank=True, null=True, verbose_name='Previous Price')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date Created')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Date Sent')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to='products.product')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_alerts', to=settings.AUTH_USER_MODEL)),
+                ('watch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='products.watch')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='watch',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_user_product_watch'),
+        ),
+        migrations.AddIndex(
+            model_name='pricealert',
+            index=models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['user', 'created_at'], name='pricealert_pending'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_watch_pricealert'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Name')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='Last History ID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Last Updated')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductPriceDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('open', models.FloatField(verbose_name='Open Price')),
+                ('close', models.FloatField(verbose_name='Close Price')),
+                ('min', models.FloatField(verbose_name='Min Price')),
+                ('max', models.FloatField(verbose_name='Max Price')),
+                ('avg', models.FloatField(verbose_name='Average Price')),
+                ('count', models.PositiveIntegerField(verbose_name='Samples')),
+                ('first_date', models.DateTimeField(verbose_name='First Sample')),
+                ('last_date', models.DateTimeField(verbose_name='Last Sample')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductPriceWeekly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('open', models.FloatField(verbose_name='Open Price')),
+                ('close', models.FloatField(verbose_name='Close Price')),
+                ('min', models.FloatField(verbose_name='Min Price')),
+                ('max', models.FloatField(verbose_name='Max Price')),
+                ('avg', models.FloatField(verbose_name='Average Price')),
+                ('count', models.PositiveIntegerField(verbose_name='Samples')),
+                ('first_date', models.DateTimeField(verbose_name='First Sample')),
+                ('last_date', models.DateTimeField(verbose_name='Last Sample')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='productpricedaily',
+            constraint=models.UniqueConstraint(fields=('product', 'date'), name='unique_product_price_daily'),
+        ),
+        migrations.AddConstraint(
+            model_name='productpriceweekly',
+            constraint=models.UniqueConstraint(fields=('product', 'date'), name='unique_product_price_weekly'),
+        ),
+    ]
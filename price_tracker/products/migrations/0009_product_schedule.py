@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_price_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='check_interval',
+            field=models.PositiveIntegerField(default=3600, help_text='Seconds', verbose_name='Check Interval'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, help_text='Empty: check on the next crawl', null=True, verbose_name='Next Check'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='volatility',
+            field=models.FloatField(default=0, help_text='Price changes per day', verbose_name='Volatility'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['store', 'next_check_at'], name='product_store_next_check'),
+        ),
+    ]
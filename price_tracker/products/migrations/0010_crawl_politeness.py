@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='http_etag',
+            field=models.CharField(blank=True, editable=False, max_length=200, verbose_name='ETag'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='http_last_modified',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Last-Modified'),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='crawl_concurrency',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Empty: CRAWLER_PER_STORE_CONCURRENCY', null=True, verbose_name='Crawl Concurrency'),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='requests_per_second',
+            field=models.FloatField(blank=True, help_text='Empty: CRAWLER_REQUESTS_PER_SECOND', null=True, verbose_name='Requests per Second'),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='user_agent',
+            field=models.CharField(blank=True, help_text='Empty: CRAWLER_USER_AGENT', max_length=200, verbose_name='User Agent'),
+        ),
+    ]
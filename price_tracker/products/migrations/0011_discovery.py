@@ -0,0 +1,109 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+# Products created by hand may repeat a (store, sku): each group is merged
+# into its oldest product before the constraint is added. The history,
+# watches and alerts are moved to it, the rollup buckets merged and the
+# latest price recomputed.
+MERGE_DUPLICATES_SQL = [
+    """
+    CREATE TEMPORARY TABLE product_members ON COMMIT DROP AS
+    SELECT id, MIN(id) OVER (PARTITION BY store_id, sku) AS kept FROM {product}
+    """,
+    'DELETE FROM product_members WHERE kept IN (SELECT kept FROM product_members GROUP BY kept HAVING COUNT(*) = 1)',
+    'UPDATE {history} SET product_id = m.kept FROM product_members m WHERE product_id = m.id AND m.id <> m.kept',
+    # One watch per user and product: the one of the kept product, else the oldest.
+    """
+    CREATE TEMPORARY TABLE watch_survivors ON COMMIT DROP AS
+    SELECT watch.id, FIRST_VALUE(watch.id) OVER (
+        PARTITION BY m.kept, watch.user_id ORDER BY watch.product_id = m.kept DESC, watch.id
+    ) AS survivor
+    FROM {watch} watch JOIN product_members m ON watch.product_id = m.id
+    """,
+    'UPDATE {alert} SET watch_id = s.survivor FROM watch_survivors s WHERE watch_id = s.id AND s.id <> s.survivor',
+    'DELETE FROM {watch} WHERE id IN (SELECT id FROM watch_survivors WHERE id <> survivor)',
+    'UPDATE {watch} SET product_id = m.kept FROM product_members m WHERE product_id = m.id AND m.id <> m.kept',
+    'UPDATE {alert} SET product_id = m.kept FROM product_members m WHERE product_id = m.id AND m.id <> m.kept',
+    *[
+        f"""
+        INSERT INTO {{{rollup}}} AS rollup (product_id, date, open, close, min, max, avg, count, first_date, last_date)
+        SELECT
+            m.kept,
+            bucket.date,
+            (array_agg(bucket.open ORDER BY bucket.first_date))[1],
+            (array_agg(bucket.close ORDER BY bucket.last_date DESC))[1],
+            MIN(bucket.min),
+            MAX(bucket.max),
+            SUM(bucket.avg * bucket.count) / SUM(bucket.count),
+            SUM(bucket.count),
+            MIN(bucket.first_date),
+            MAX(bucket.last_date)
+        FROM {{{rollup}}} bucket JOIN product_members m ON bucket.product_id = m.id AND m.id <> m.kept
+        GROUP BY 1, 2
+        ON CONFLICT (product_id, date) DO UPDATE SET
+            open = CASE WHEN EXCLUDED.first_date < rollup.first_date THEN EXCLUDED.open ELSE rollup.open END,
+            close = CASE WHEN EXCLUDED.last_date >= rollup.last_date THEN EXCLUDED.close ELSE rollup.close END,
+            min = LEAST(rollup.min, EXCLUDED.min),
+            max = GREATEST(rollup.max, EXCLUDED.max),
+            avg = (rollup.avg * rollup.count + EXCLUDED.avg * EXCLUDED.count) / (rollup.count + EXCLUDED.count),
+            count = rollup.count + EXCLUDED.count,
+            first_date = LEAST(rollup.first_date, EXCLUDED.first_date),
+            last_date = GREATEST(rollup.last_date, EXCLUDED.last_date)
+        """
+        for rollup in ['daily', 'weekly']
+    ],
+    'DELETE FROM {latest} WHERE product_id IN (SELECT id FROM product_members)',
+    """
+    INSERT INTO {latest} (product_id, price, last_price, discount_rate, date)
+    SELECT DISTINCT ON (product_id) product_id, price, last_price, COALESCE(discount_rate, 0), date
+    FROM {history}
+    WHERE product_id IN (SELECT kept FROM product_members)
+    ORDER BY product_id, date DESC
+    """,
+    'DELETE FROM {daily} WHERE product_id IN (SELECT id FROM product_members WHERE id <> kept)',
+    'DELETE FROM {weekly} WHERE product_id IN (SELECT id FROM product_members WHERE id <> kept)',
+    'DELETE FROM {product} WHERE id IN (SELECT id FROM product_members WHERE id <> kept)',
+    # Check the deferred foreign keys now, ALTER TABLE refuses pending trigger events.
+    'SET CONSTRAINTS ALL IMMEDIATE',
+    'SET CONSTRAINTS ALL DEFERRED',
+]
+
+
+def merge_duplicates(apps, schema_editor):
+    tables = {
+        name: apps.get_model('products', model)._meta.db_table
+        for name, model in [
+            ('product', 'Product'),
+            ('history', 'ProductHistory'),
+            ('latest', 'ProductLatestPrice'),
+            ('daily', 'ProductPriceDaily'),
+            ('weekly', 'ProductPriceWeekly'),
+            ('watch', 'Watch'),
+            ('alert', 'PriceAlert'),
+        ]
+    }
+    with schema_editor.connection.cursor() as cursor:
+        for sql in MERGE_DUPLICATES_SQL:
+            cursor.execute(sql.format(**tables))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_crawl_politeness'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='discovery_url',
+            field=models.URLField(blank=True, help_text='Empty: <base_url>/sitemap.xml', max_length=500, verbose_name='Sitemap or Feed URL'),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('store', 'sku'), name='unique_store_sku'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:30
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_discovery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_ids', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None, verbose_name='Products')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('leased', 'Leased'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('leased_by', models.CharField(blank=True, max_length=200, verbose_name='Worker')),
+                ('leased_until', models.DateTimeField(blank=True, null=True, verbose_name='Lease Expiry')),
+                ('checked', models.PositiveIntegerField(default=0, verbose_name='Products Checked')),
+                ('last_error', models.TextField(blank=True, verbose_name='Last Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date Created')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Date Finished')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='crawl_tasks', to='products.store')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status__in', ['pending', 'leased'])), fields=['store', 'id'], name='crawltask_active'), models.Index(condition=models.Q(('status', 'done')), fields=['finished_at'], name='crawltask_done')],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.0.1 on 2026-10-18 19:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_crawltask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CrawlRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('products', models.PositiveIntegerField(default=0, verbose_name='Products Checked')),
+                ('pages', models.PositiveIntegerField(default=0, verbose_name='Pages Fetched')),
+                ('bytes', models.BigIntegerField(default=0, verbose_name='Bytes Downloaded')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Failed Requests')),
+                ('not_modified', models.PositiveIntegerField(default=0, verbose_name='Not Modified')),
+                ('parse_failures', models.PositiveIntegerField(default=0, verbose_name='Parse Failures')),
+                ('rows_written', models.PositiveIntegerField(default=0, verbose_name='Rows Written')),
+                ('price_changes', models.PositiveIntegerField(default=0, verbose_name='Price Changes')),
+                ('fetch_seconds', models.FloatField(default=0, help_text='Seconds, sum of all requests', verbose_name='Fetch Time')),
+                ('parse_seconds', models.FloatField(default=0, help_text='Seconds, sum of all pages', verbose_name='Parse Time')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('finished', 'Finished'), ('failed', 'Failed')], default='running', max_length=10, verbose_name='Status')),
+                ('worker', models.CharField(blank=True, max_length=200, verbose_name='Worker')),
+                ('write_seconds', models.FloatField(default=0, help_text='Seconds spent writing to the database', verbose_name='Write Time')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date Started')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Date Finished')),
+                ('task', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='runs', to='products.crawltask')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CrawlStoreStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('products', models.PositiveIntegerField(default=0, verbose_name='Products Checked')),
+                ('pages', models.PositiveIntegerField(default=0, verbose_name='Pages Fetched')),
+                ('bytes', models.BigIntegerField(default=0, verbose_name='Bytes Downloaded')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='Failed Requests')),
+                ('not_modified', models.PositiveIntegerField(default=0, verbose_name='Not Modified')),
+                ('parse_failures', models.PositiveIntegerField(default=0, verbose_name='Parse Failures')),
+                ('rows_written', models.PositiveIntegerField(default=0, verbose_name='Rows Written')),
+                ('price_changes', models.PositiveIntegerField(default=0, verbose_name='Price Changes')),
+                ('fetch_seconds', models.FloatField(default=0, help_text='Seconds, sum of all requests', verbose_name='Fetch Time')),
+                ('parse_seconds', models.FloatField(default=0, help_text='Seconds, sum of all pages', verbose_name='Parse Time')),
+                ('fetch_p50', models.FloatField(blank=True, help_text='Seconds', null=True, verbose_name='Fetch p50')),
+                ('fetch_p95', models.FloatField(blank=True, help_text='Seconds', null=True, verbose_name='Fetch p95')),
+                ('parse_p50', models.FloatField(blank=True, help_text='Seconds', null=True, verbose_name='Parse p50')),
+                ('parse_p95', models.FloatField(blank=True, help_text='Seconds', null=True, verbose_name='Parse p95')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='store_stats', to='products.crawlrun')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='crawl_stats', to='products.store')),
+            ],
+            options={
+                'verbose_name_plural': 'crawl store stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='crawlrun',
+            index=models.Index(fields=['-started_at'], name='crawlrun_started'),
+        ),
+        migrations.AddConstraint(
+            model_name='crawlstorestats',
+            constraint=models.UniqueConstraint(fields=('run', 'store'), name='unique_crawl_run_store'),
+        ),
+    ]
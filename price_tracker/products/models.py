@@ -1,13 +1,22 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 
 from core.models import BaseModel
 
+from .matching import get_match_key
+
 
 class Store(BaseModel):
     shortname = models.CharField(verbose_name='Short Name', max_length=100)
     base_url = models.URLField(verbose_name='Base URL')
     image = models.URLField(verbose_name='Image URL', blank=True)
+    crawl_concurrency = models.PositiveSmallIntegerField(verbose_name='Crawl Concurrency', blank=True, null=True, help_text='Empty: CRAWLER_PER_STORE_CONCURRENCY')
+    requests_per_second = models.FloatField(verbose_name='Requests per Second', blank=True, null=True, help_text='Empty: CRAWLER_REQUESTS_PER_SECOND')
+    user_agent = models.CharField(verbose_name='User Agent', max_length=200, blank=True, help_text='Empty: CRAWLER_USER_AGENT')
+    discovery_url = models.URLField(verbose_name='Sitemap or Feed URL', max_length=500, blank=True, help_text='Empty: <base_url>/sitemap.xml')
 
     def __str__(self):
         return self.name
@@ -23,9 +32,32 @@ class Product(models.Model):
     sku = models.CharField(verbose_name='SKU', max_length=100)
     link = models.URLField(verbose_name='URL Product', max_length=500)
     image = models.URLField(verbose_name='URL Image', max_length=500)    
+    match_key = models.CharField(verbose_name='Match Key', max_length=200, blank=True, editable=False, db_index=True)
+    next_check_at = models.DateTimeField(verbose_name='Next Check', blank=True, null=True, help_text='Empty: check on the next crawl')
+    check_interval = models.PositiveIntegerField(verbose_name='Check Interval', default=60 * 60, help_text='Seconds')
+    volatility = models.FloatField(verbose_name='Volatility', default=0, help_text='Price changes per day')
+    http_etag = models.CharField(verbose_name='ETag', max_length=200, blank=True, editable=False)
+    http_last_modified = models.CharField(verbose_name='Last-Modified', max_length=100, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'next_check_at'], name='product_store_next_check'),
+            GinIndex(fields=['categories'], name='product_categories_gin'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='product_name_trgm'),
+            GinIndex(fields=['brand'], opclasses=['gin_trgm_ops'], name='product_brand_trgm'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'sku'], name='unique_store_sku'),
+        ]
     
     def __str__(self):
         return f'{self.store.name}: {self.name}, {self.sku}'
+
+    def save(self, *args, **kwargs):
+        self.match_key = get_match_key(self.brand, self.model, self.sku)
+        if 'update_fields' in kwargs and kwargs['update_fields'] is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'match_key'}
+        super().save(*args, **kwargs)
     
     
 class ProductHistory(models.Model):
@@ -34,6 +66,222 @@ class ProductHistory(models.Model):
     last_price = models.FloatField(verbose_name='Last Price')
     discount_rate = models.FloatField(verbose_name='Discount Rate', blank=True, null=True)
     date = models.DateTimeField(verbose_name='Date')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['product', '-date'],
+                include=['price', 'last_price', 'discount_rate'],
+                name='producthistory_product_date',
+            ),
+        ]
     
     def __str__(self):
-        return f'{self.product.name}: {self.product.sku}, {self.price}'
\ No newline at end of file
+        return f'{self.product.name}: {self.product.sku}, {self.price}'
+
+class ProductLatestPrice(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='latest_price')
+    price = models.FloatField(verbose_name='Current Price')
+    last_price = models.FloatField(verbose_name='Last Price')
+    discount_rate = models.FloatField(verbose_name='Discount Rate', default=0)
+    date = models.DateTimeField(verbose_name='Date')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['price', 'product'], name='latestprice_price'),
+            models.Index(fields=['discount_rate', 'product'], name='latestprice_discount'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id}: {self.price}'
+
+
+class Watch(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='watches')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='watches')
+    target_price = models.FloatField(verbose_name='Target Price', blank=True, null=True)
+    drop_rate = models.FloatField(verbose_name='Drop Rate', blank=True, null=True, help_text='Percentage below the reference price')
+    reference_price = models.FloatField(verbose_name='Reference Price', blank=True, null=True)
+    notified_price = models.FloatField(verbose_name='Notified Price', blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Date Created')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_user_product_watch'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.product_id}'
+
+
+class PriceAlert(models.Model):
+    watch = models.ForeignKey(Watch, on_delete=models.CASCADE, related_name='alerts')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='price_alerts')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_alerts')
+    price = models.FloatField(verbose_name='Price')
+    previous_price = models.FloatField(verbose_name='Previous Price', blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Date Created')
+    sent_at = models.DateTimeField(verbose_name='Date Sent', blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'created_at'],
+                condition=models.Q(sent_at__isnull=True),
+                name='pricealert_pending',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.product_id}, {self.price}'
+
+
+class ProductPriceRollup(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    date = models.DateField(verbose_name='Date')
+    open = models.FloatField(verbose_name='Open Price')
+    close = models.FloatField(verbose_name='Close Price')
+    min = models.FloatField(verbose_name='Min Price')
+    max = models.FloatField(verbose_name='Max Price')
+    avg = models.FloatField(verbose_name='Average Price')
+    count = models.PositiveIntegerField(verbose_name='Samples')
+    first_date = models.DateTimeField(verbose_name='First Sample')
+    last_date = models.DateTimeField(verbose_name='Last Sample')
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f'{self.product_id}: {self.date}, {self.close}'
+
+
+class ProductPriceDaily(ProductPriceRollup):
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='unique_product_price_daily'),
+        ]
+
+
+class ProductPriceWeekly(ProductPriceRollup):
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='unique_product_price_weekly'),
+        ]
+
+
+class RollupWatermark(models.Model):
+    name = models.CharField(verbose_name='Name', max_length=100, unique=True)
+    last_id = models.BigIntegerField(verbose_name='Last History ID', default=0)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Last Updated')
+
+    def __str__(self):
+        return f'{self.name}: {self.last_id}'
+
+
+class CrawlTask(models.Model):
+    PENDING = 'pending'
+    LEASED = 'leased'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (LEASED, 'Leased'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='crawl_tasks')
+    product_ids = ArrayField(models.IntegerField(), verbose_name='Products')
+    status = models.CharField(verbose_name='Status', max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(verbose_name='Attempts', default=0)
+    leased_by = models.CharField(verbose_name='Worker', max_length=200, blank=True)
+    leased_until = models.DateTimeField(verbose_name='Lease Expiry', blank=True, null=True)
+    checked = models.PositiveIntegerField(verbose_name='Products Checked', default=0)
+    last_error = models.TextField(verbose_name='Last Error', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Date Created')
+    finished_at = models.DateTimeField(verbose_name='Date Finished', blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['store', 'id'],
+                condition=models.Q(status__in=['pending', 'leased']),
+                name='crawltask_active',
+            ),
+            models.Index(
+                fields=['finished_at'],
+                condition=models.Q(status='done'),
+                name='crawltask_done',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.store_id}: {len(self.product_ids)} products, {self.status}'
+
+
+class CrawlCounters(models.Model):
+    products = models.PositiveIntegerField(verbose_name='Products Checked', default=0)
+    pages = models.PositiveIntegerField(verbose_name='Pages Fetched', default=0)
+    bytes = models.BigIntegerField(verbose_name='Bytes Downloaded', default=0)
+    failed = models.PositiveIntegerField(verbose_name='Failed Requests', default=0)
+    not_modified = models.PositiveIntegerField(verbose_name='Not Modified', default=0)
+    parse_failures = models.PositiveIntegerField(verbose_name='Parse Failures', default=0)
+    rows_written = models.PositiveIntegerField(verbose_name='Rows Written', default=0)
+    price_changes = models.PositiveIntegerField(verbose_name='Price Changes', default=0)
+    fetch_seconds = models.FloatField(verbose_name='Fetch Time', default=0, help_text='Seconds, sum of all requests')
+    parse_seconds = models.FloatField(verbose_name='Parse Time', default=0, help_text='Seconds, sum of all pages')
+
+    class Meta:
+        abstract = True
+
+
+class CrawlRun(CrawlCounters):
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (FINISHED, 'Finished'),
+        (FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(verbose_name='Status', max_length=10, choices=STATUS_CHOICES, default=RUNNING)
+    worker = models.CharField(verbose_name='Worker', max_length=200, blank=True)
+    task = models.ForeignKey(CrawlTask, on_delete=models.SET_NULL, blank=True, null=True, related_name='runs')
+    write_seconds = models.FloatField(verbose_name='Write Time', default=0, help_text='Seconds spent writing to the database')
+    started_at = models.DateTimeField(verbose_name='Date Started', default=timezone.now)
+    finished_at = models.DateTimeField(verbose_name='Date Finished', blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-started_at'], name='crawlrun_started'),
+        ]
+
+    def __str__(self):
+        return f'{self.pk}: {self.started_at:%Y-%m-%d %H:%M}, {self.status}'
+
+    @property
+    def duration(self):
+        if self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+
+class CrawlStoreStats(CrawlCounters):
+    run = models.ForeignKey(CrawlRun, on_delete=models.CASCADE, related_name='store_stats')
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='crawl_stats')
+    fetch_p50 = models.FloatField(verbose_name='Fetch p50', blank=True, null=True, help_text='Seconds')
+    fetch_p95 = models.FloatField(verbose_name='Fetch p95', blank=True, null=True, help_text='Seconds')
+    parse_p50 = models.FloatField(verbose_name='Parse p50', blank=True, null=True, help_text='Seconds')
+    parse_p95 = models.FloatField(verbose_name='Parse p95', blank=True, null=True, help_text='Seconds')
+
+    class Meta:
+        verbose_name_plural = 'crawl store stats'
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'store'], name='unique_crawl_run_store'),
+        ]
+
+    def __str__(self):
+        return f'{self.run_id}: {self.store_id}'
@@ -0,0 +1,140 @@
+"""
+Monthly range partitioning of the `ProductHistory` table on `date`.
+
+Old months live in their own tables, so they can be detached (and archived
+with `pg_dump -t`) or dropped instantly instead of running a huge DELETE.
+"""
+import datetime
+
+
+TABLE = 'products_producthistory'
+PRODUCT_TABLE = 'products_product'
+INDEX = 'producthistory_product_date'
+
+
+def month_start(value):
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def create_partition(cursor, month):
+    month = month_start(month)
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} '
+        f'FOR VALUES FROM (%s) TO (%s)',
+        [month, add_months(month, 1)],
+    )
+
+
+def ensure_partitions(cursor, months_ahead=3, since=None):
+    """
+    Create the monthly partitions from `since` (default: this month) up to
+    `months_ahead` months in the future.
+    """
+    month = month_start(since or datetime.datetime.now(datetime.timezone.utc))
+    last = add_months(month_start(datetime.datetime.now(datetime.timezone.utc)), months_ahead)
+    created = []
+    while month <= last:
+        create_partition(cursor, month)
+        created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def list_partitions(cursor):
+    """
+    Return `(name, lower bound, estimated rows)` for each attached partition,
+    the default partition has no lower bound.
+    """
+    cursor.execute(
+        """
+        SELECT child.relname, child.reltuples
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        ORDER BY child.relname
+        """,
+        [TABLE],
+    )
+    partitions = []
+    for name, rows in cursor.fetchall():
+        month = None
+        if name.startswith(f'{TABLE}_p'):
+            month = datetime.datetime.strptime(name[-6:], '%Y%m').replace(tzinfo=datetime.timezone.utc)
+        partitions.append((name, month, max(int(rows), 0)))
+    return partitions
+
+
+def detach_partition(cursor, name):
+    cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+    # The detached table is an archive, it must not block deleting products.
+    cursor.execute(f'ALTER TABLE {name} DROP CONSTRAINT IF EXISTS {TABLE}_product_id_fk')
+
+
+def drop_partition(cursor, name):
+    cursor.execute(f'DROP TABLE {name}')
+
+
+def _add_constraints(cursor, primary_key):
+    cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({primary_key})')
+    cursor.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_product_id_fk '
+        f'FOREIGN KEY (product_id) REFERENCES {PRODUCT_TABLE} (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+    cursor.execute(
+        f'CREATE INDEX {INDEX} ON {TABLE} (product_id, date DESC) '
+        f'INCLUDE (price, last_price, discount_rate)'
+    )
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {TABLE}"
+    )
+
+
+def partition_table(cursor, months_ahead=3):
+    """
+    Rebuild `ProductHistory` as a table partitioned by month, copying the
+    existing rows. The primary key becomes `(id, date)` because Postgres
+    requires the partition key in every unique constraint.
+    """
+    if is_partitioned(cursor):
+        return
+    cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old')
+    cursor.execute(
+        f'CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS INCLUDING IDENTITY) '
+        f'PARTITION BY RANGE (date)'
+    )
+    cursor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    cursor.execute(f'SELECT MIN(date) FROM {TABLE}_old')
+    ensure_partitions(cursor, months_ahead, since=cursor.fetchone()[0])
+    cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_old')
+    cursor.execute(f'DROP TABLE {TABLE}_old')
+    _add_constraints(cursor, 'id, date')
+
+
+def unpartition_table(cursor):
+    """
+    Rebuild `ProductHistory` as a plain table with the rows of the attached
+    partitions.
+    """
+    if not is_partitioned(cursor):
+        return
+    cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned')
+    cursor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING DEFAULTS INCLUDING IDENTITY)')
+    cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_partitioned')
+    cursor.execute(f'DROP TABLE {TABLE}_partitioned CASCADE')
+    _add_constraints(cursor, 'id')
@@ -0,0 +1,137 @@
+"""
+Daily and weekly price rollups of `ProductHistory`.
+
+`update_rollups()` only reads the history rows newer than the watermark
+of its last run and merges their aggregates into the existing buckets, so
+it can run as often as needed. `compact_history()` then deletes the raw
+rows that are already rolled up and older than the retention period,
+except the newest row of each product (its current price).
+
+Ids are taken at INSERT but become visible at COMMIT, so the watermark
+only moves up to `safe_horizon()`: the highest id once every transaction
+writing history has committed. Rows of a batch still in flight are never
+skipped.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.routers import use_primary
+
+from .models import ProductHistory, ProductPriceDaily, ProductPriceWeekly, RollupWatermark
+
+
+WATERMARK = 'price_rollups'
+CHUNK_SIZE = 500_000
+
+ROLLUPS = [
+    (ProductPriceDaily, 'day'),
+    (ProductPriceWeekly, 'week'),
+]
+
+MERGE_SQL = """
+INSERT INTO {table} AS rollup (product_id, date, open, close, min, max, avg, count, first_date, last_date)
+SELECT
+    product_id,
+    date_trunc(%(kind)s, date AT TIME ZONE %(tz)s)::date,
+    (array_agg(price ORDER BY date))[1],
+    (array_agg(price ORDER BY date DESC))[1],
+    MIN(price),
+    MAX(price),
+    AVG(price),
+    COUNT(*),
+    MIN(date),
+    MAX(date)
+FROM {history}
+WHERE id > %(start)s AND id <= %(end)s
+GROUP BY 1, 2
+ON CONFLICT (product_id, date) DO UPDATE SET
+    open = CASE WHEN EXCLUDED.first_date < rollup.first_date THEN EXCLUDED.open ELSE rollup.open END,
+    close = CASE WHEN EXCLUDED.last_date >= rollup.last_date THEN EXCLUDED.close ELSE rollup.close END,
+    min = LEAST(rollup.min, EXCLUDED.min),
+    max = GREATEST(rollup.max, EXCLUDED.max),
+    avg = (rollup.avg * rollup.count + EXCLUDED.avg * EXCLUDED.count) / (rollup.count + EXCLUDED.count),
+    count = rollup.count + EXCLUDED.count,
+    first_date = LEAST(rollup.first_date, EXCLUDED.first_date),
+    last_date = GREATEST(rollup.last_date, EXCLUDED.last_date)
+"""
+
+
+def safe_horizon():
+    """
+    Highest history id below which no row can still appear. The SHARE lock
+    waits for the transactions inserting rows (which hold ROW EXCLUSIVE
+    from before their ids are taken) and is released right away, so new
+    inserts only wait for the `MAX(id)` lookup.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {ProductHistory._meta.db_table} IN SHARE MODE')
+        return ProductHistory.objects.order_by('-id').values_list('id', flat=True).first()
+
+
+def get_watermark():
+    return RollupWatermark.objects.filter(name=WATERMARK).values_list('last_id', flat=True).first() or 0
+
+
+@use_primary()
+def update_rollups(chunk_size=CHUNK_SIZE):
+    """
+    Merge the history rows newer than the watermark into the daily and
+    weekly rollups, `chunk_size` ids per statement. Returns the number of
+    history ids processed.
+    """
+    history = ProductHistory._meta.db_table
+    # Outside of the merge transaction, which would keep the lock.
+    horizon = safe_horizon() or 0
+    with transaction.atomic():
+        watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+        start = watermark.last_id
+        end = max(horizon, start)
+
+        with connection.cursor() as cursor:
+            for chunk_start in range(start, end, chunk_size):
+                params = {
+                    'start': chunk_start,
+                    'end': min(chunk_start + chunk_size, end),
+                    'tz': settings.TIME_ZONE,
+                }
+                for model, kind in ROLLUPS:
+                    sql = MERGE_SQL.format(table=model._meta.db_table, history=history)
+                    cursor.execute(sql, {**params, 'kind': kind})
+
+        watermark.last_id = end
+        watermark.save()
+    return end - start
+
+
+@use_primary()
+def compact_history(days, batch_size=10_000):
+    """
+    Delete, in batches, the history rows older than `days` that are already
+    in the rollups. The newest row of each product is kept even when it is
+    older: prices are only written when they change, so it is the current
+    price. With a partitioned table, dropping whole months with
+    `history_partitions --drop-before` is cheaper.
+    """
+    history = ProductHistory._meta.db_table
+    watermark = get_watermark()
+    deleted = 0
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                f"""
+                DELETE FROM {history} WHERE id IN (
+                    SELECT id FROM {history} old
+                    WHERE old.date < NOW() - make_interval(days => %s) AND old.id <= %s
+                    AND EXISTS (
+                        SELECT 1 FROM {history} newer
+                        WHERE newer.product_id = old.product_id
+                        AND (newer.date, newer.id) > (old.date, old.id)
+                    )
+                    LIMIT %s
+                )
+                """,
+                [days, watermark, batch_size],
+            )
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
@@ -0,0 +1,127 @@
+"""
+Adaptive crawl schedule of the products.
+
+Each product has a `check_interval` that is divided by `SCHEDULER_BACKOFF`
+when a crawl finds a new price and multiplied by it when the price did not
+change, within `SCHEDULER_MIN_INTERVAL` and `SCHEDULER_MAX_INTERVAL`. Its
+`volatility` (price changes per day over the last `SCHEDULER_WINDOW_DAYS`)
+caps the interval at half the expected time between changes, and watched
+products wait only `SCHEDULER_WATCHED_FACTOR` of it. A crawl only fetches
+the products whose `next_check_at` is due. Products whose page could not be
+fetched or parsed keep their interval and are retried after it.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.routers import use_primary
+
+from .models import Product, ProductHistory, Watch
+
+
+BATCH_SIZE = 10_000
+
+RESCHEDULE_SQL = """
+WITH checked AS (
+    SELECT
+        product.id,
+        CASE WHEN product.id = ANY(%(changed)s)
+            THEN GREATEST(%(min)s, ROUND(product.check_interval / %(backoff)s))
+            ELSE LEAST(%(max)s, ROUND(product.check_interval * %(backoff)s))
+        END AS interval,
+        (
+            SELECT COUNT(*) FROM {history} history
+            WHERE history.product_id = product.id AND history.date >= %(since)s
+        )::float / %(days)s AS volatility,
+        EXISTS (SELECT 1 FROM {watch} watch WHERE watch.product_id = product.id) AS watched
+    FROM {product} product
+    WHERE product.id = ANY(%(checked)s)
+)
+UPDATE {product} product SET
+    check_interval = checked.interval,
+    volatility = checked.volatility,
+    next_check_at = %(now)s + make_interval(secs => GREATEST(
+        %(min)s,
+        LEAST(
+            checked.interval,
+            CASE WHEN checked.volatility > 0 THEN 86400 / (2 * checked.volatility) ELSE checked.interval END
+        ) * CASE WHEN checked.watched THEN %(watched_factor)s ELSE 1 END
+    ))
+FROM checked
+WHERE product.id = checked.id
+"""
+
+RETRY_SQL = """
+UPDATE {product} SET next_check_at = %(now)s + make_interval(secs => GREATEST(%(min)s, check_interval))
+WHERE id = ANY(%(failed)s)
+"""
+
+
+def due_products(store, now=None):
+    """
+    Products of `store` to check now, never checked ones first.
+    """
+    now = now or timezone.now()
+    return (
+        Product.objects.filter(store=store)
+        .filter(Q(next_check_at__isnull=True) | Q(next_check_at__lte=now))
+        .order_by(F('next_check_at').asc(nulls_first=True))
+    )
+
+
+@use_primary()
+def reschedule(checked, changed, now=None):
+    """
+    Set the next check of the `checked` product ids, the ones in `changed`
+    got a new price. Returns the number of products updated.
+    """
+    now = now or timezone.now()
+    checked = sorted(set(checked))
+    changed = set(changed)
+    days = settings.SCHEDULER_WINDOW_DAYS
+    sql = RESCHEDULE_SQL.format(
+        product=Product._meta.db_table,
+        history=ProductHistory._meta.db_table,
+        watch=Watch._meta.db_table,
+    )
+    updated = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(checked), BATCH_SIZE):
+            batch = checked[start:start + BATCH_SIZE]
+            cursor.execute(sql, {
+                'checked': batch,
+                'changed': [pk for pk in batch if pk in changed],
+                'min': settings.SCHEDULER_MIN_INTERVAL,
+                'max': settings.SCHEDULER_MAX_INTERVAL,
+                'backoff': settings.SCHEDULER_BACKOFF,
+                'watched_factor': settings.SCHEDULER_WATCHED_FACTOR,
+                'since': now - datetime.timedelta(days=days),
+                'days': days,
+                'now': now,
+            })
+            updated += cursor.rowcount
+    return updated
+
+
+@use_primary()
+def retry(failed, now=None):
+    """
+    Set the next check of the `failed` product ids after their current
+    interval, which is left as is. Returns the number of products updated.
+    """
+    now = now or timezone.now()
+    failed = sorted(set(failed))
+    sql = RETRY_SQL.format(product=Product._meta.db_table)
+    updated = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(failed), BATCH_SIZE):
+            cursor.execute(sql, {
+                'failed': failed[start:start + BATCH_SIZE],
+                'min': settings.SCHEDULER_MIN_INTERVAL,
+                'now': now,
+            })
+            updated += cursor.rowcount
+    return updated
@@ -0,0 +1,18 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_products
+from .models import Product, Store
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_products, [instance.pk]))
+
+
+@receiver([post_save, post_delete], sender=Store)
+def invalidate_store(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_products)
@@ -0,0 +1,7 @@
+"""
+Price extractors of the stores, one module per store.
+
+Each module registers its extractor with `@register(shortname)`; they are
+all imported by `products.extractors.autodiscover()`, when the app is ready
+and in the parse worker processes of the crawler.
+"""
@@ -1,3 +1,705 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import QueuedEmail
+
+from . import crawl_queue
+from .alerts import evaluate_alerts, queue_alert_digests, window_start
+from .analytics import DAY, analyze, range_reduce, window_starts
+from .catalog import InvalidCursor, keyset_page
+from .crawler import Crawler
+from .db import close_pool
+from .discovery import Discovery
+from .extractors import EXTRACTORS, Extractor, register, to_float
+from .history import lttb
+from .ingestion import PriceIngestor
+from .matching import get_match_key
+from .models import (
+    CrawlRun,
+    CrawlTask,
+    PriceAlert,
+    Product,
+    ProductHistory,
+    ProductLatestPrice,
+    ProductPriceDaily,
+    ProductPriceWeekly,
+    Store,
+    Watch,
+)
+from .rollups import compact_history, get_watermark, safe_horizon, update_rollups
+
+
+class ToFloatTests(SimpleTestCase):
+
+    def test_separators(self):
+        self.assertEqual(to_float('1,299.00'), 1299.0)
+        self.assertEqual(to_float('1.299,00'), 1299.0)
+        self.assertEqual(to_float('12,50'), 12.5)
+        self.assertEqual(to_float('1,299'), 1299.0)
+
+    def test_currency_and_numbers(self):
+        self.assertEqual(to_float('$ 899'), 899.0)
+        self.assertEqual(to_float(5), 5.0)
+        self.assertIsNone(to_float(''))
+        self.assertIsNone(to_float('N/A'))
+
+
+class MatchKeyTests(SimpleTestCase):
+
+    def test_model_wins_over_sku(self):
+        self.assertEqual(get_match_key('Samsung', 'SM-A54', 'X1'), 'samsung:sma54')
+
+    def test_sku_without_model(self):
+        self.assertEqual(get_match_key('Samsung', None, 'AB-1'), 'samsung:sku:ab1')
+
+    def test_normalized(self):
+        self.assertEqual(get_match_key('Electrónica S.A.', 'TV 55'), get_match_key('electronica sa', 'tv-55'))
+
+    def test_nothing_to_match(self):
+        self.assertEqual(get_match_key('Samsung'), '')
+
+
+class LttbTests(SimpleTestCase):
+
+    def points(self, prices):
+        start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        return [(start + datetime.timedelta(hours=i), price) for i, price in enumerate(prices)]
+
+    def test_short_series_unchanged(self):
+        points = self.points([1, 2, 3])
+        self.assertEqual(lttb(points, 10), points)
+        self.assertEqual(lttb(points, 2), points)
+
+    def test_keeps_ends_and_spikes(self):
+        prices = [10.0] * 100
+        prices[37] = 1.0
+        points = self.points(prices)
+        sampled = lttb(points, 10)
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual(sampled[0], points[0])
+        self.assertEqual(sampled[-1], points[-1])
+        self.assertIn(points[37], sampled)
+
+
+class RollingTests(SimpleTestCase):
+
+    def test_matches_slices(self):
+        rng = np.random.default_rng(0)
+        values = rng.random(50)
+        starts = rng.integers(0, 50, 200)
+        ends = np.maximum(starts, rng.integers(0, 50, 200))
+        for ufunc, reduce in [(np.minimum, np.min), (np.maximum, np.max)]:
+            expected = [reduce(values[start:end + 1]) for start, end in zip(starts, ends)]
+            np.testing.assert_array_equal(range_reduce(values, starts, ends, ufunc), expected)
+
+    def test_window_starts_include_price_in_effect(self):
+        timestamps = np.array([0, DAY, 2 * DAY, 2 * DAY + 60, 5 * DAY])
+        np.testing.assert_array_equal(window_starts(timestamps, 1), [0, 0, 1, 1, 3])
+
+
+class AnalyzeTests(SimpleTestCase):
+
+    def series(self, rows):
+        timestamps = np.array([day * DAY for day, _ in rows], dtype=float)
+        price = np.array([price for _, price in rows], dtype=float)
+        return timestamps, price, price, np.zeros(len(price))
+
+    def at_day(self, day):
+        return datetime.datetime.fromtimestamp(day * DAY, tz=datetime.timezone.utc)
+
+    def test_window_ends_now(self):
+        stats = analyze(*self.series([(0, 100), (20, 50), (25, 80)]), days=30, now=self.at_day(90))
+        self.assertEqual(stats['min_30d'], 80)
+        self.assertEqual(stats['max_30d'], 80)
+        self.assertAlmostEqual(stats['changes_per_day'], 2 / 90)
+
+    def test_window_includes_price_in_effect(self):
+        stats = analyze(*self.series([(0, 100), (20, 50), (25, 80)]), days=30, now=self.at_day(40))
+        self.assertEqual(stats['min_30d'], 50)
+        self.assertEqual(stats['max_30d'], 100)
+
+
+class WindowStartTests(SimpleTestCase):
+
+    def test_window_start(self):
+        now = datetime.datetime(2024, 5, 1, 10, 37, 20, tzinfo=datetime.timezone.utc)
+        self.assertEqual(window_start(now, 15), now.replace(minute=30, second=0))
+        self.assertEqual(window_start(now, 60 * 24), now.replace(hour=0, minute=0, second=0))
+
+
+class KeysetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name='Store', shortname='store', base_url='http://store.test')
+        now = timezone.now()
+        for i, price in enumerate([30, 10, 20, 10, 40]):
+            product = Product.objects.create(
+                store=store, name=f'P{i}', brand='B', sku=str(i), link=f'http://store.test/{i}', image='',
+            )
+            ProductLatestPrice.objects.create(product=product, price=price, last_price=price, date=now)
+
+    def pages(self, sort, size=2):
+        pages, cursor = [], None
+        while True:
+            items, cursor = keyset_page(Product.objects.all(), sort, cursor, size)
+            pages.append(items)
+            if cursor is None:
+                return pages
+
+    def test_newest_first(self):
+        pages = self.pages(None)
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        pks = [product.pk for page in pages for product in page]
+        self.assertEqual(pks, sorted(Product.objects.values_list('pk', flat=True), reverse=True))
+
+    def test_price_with_ties(self):
+        products = [product for page in self.pages('price') for product in page]
+        self.assertEqual([product.latest_price.price for product in products], [10, 10, 20, 30, 40])
+        self.assertEqual(len({product.pk for product in products}), 5)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            keyset_page(Product.objects.all(), 'price', 'tampered')
+
+
+class IngestionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name='Store', shortname='store', base_url='http://store.test')
+        cls.products = [
+            Product.objects.create(
+                store=store, name=f'P{i}', brand='B', sku=str(i), link=f'http://store.test/{i}', image='',
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.ingestor = PriceIngestor(chunk_size=100, use_copy=False, alerts=False)
+        self.now = timezone.now()
+
+    def test_skips_unchanged_prices(self):
+        product = self.products[0]
+        self.ingestor.add(product.pk, 100, self.now - datetime.timedelta(hours=2))
+        self.ingestor.add(product.pk, 100, self.now - datetime.timedelta(hours=1))
+        self.ingestor.add(product.pk, 90, self.now)
+        rows = self.ingestor.flush()
+        self.assertEqual([(row.price, row.last_price) for row in rows], [(100, 100), (90, 100)])
+        self.assertEqual((self.ingestor.written, self.ingestor.skipped), (2, 1))
+
+        self.ingestor = PriceIngestor(use_copy=False, alerts=False)
+        self.ingestor.add(product.pk, 90)
+        self.assertEqual(self.ingestor.flush(), [])
+        self.assertEqual(ProductHistory.objects.count(), 2)
+
+    def test_last_price_from_snapshot(self):
+        product = self.products[0]
+        ProductLatestPrice.objects.create(product=product, price=100, last_price=100, date=self.now)
+        self.ingestor.add(product.pk, 80)
+        [row] = self.ingestor.flush()
+        self.assertEqual((row.last_price, row.discount_rate), (100, 20.0))
+
+    def test_last_price_from_history(self):
+        product = self.products[0]
+        for days, price in [(2, 120), (1, 100)]:
+            ProductHistory.objects.create(
+                product=product, price=price, last_price=price, date=self.now - datetime.timedelta(days=days),
+            )
+        self.ingestor.add(product.pk, 90)
+        [row] = self.ingestor.flush()
+        self.assertEqual((row.last_price, row.discount_rate), (100, 10.0))
+
+    def test_flushes_every_chunk(self):
+        self.ingestor.chunk_size = 2
+        self.assertEqual(self.ingestor.add(self.products[0].pk, 10), [])
+        rows = self.ingestor.add_many([(self.products[1].pk, 20, None), (self.products[2].pk, 30, None)])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(ProductHistory.objects.count(), 2)
+        self.assertEqual(len(self.ingestor.flush()), 1)
+        self.assertEqual(ProductHistory.objects.count(), 3)
+
+    def test_updates_latest_price_snapshot(self):
+        first, second = self.products[:2]
+        ProductLatestPrice.objects.create(
+            product=first, price=100, last_price=100, date=self.now - datetime.timedelta(days=1),
+        )
+        self.ingestor.add(first.pk, 90, self.now - datetime.timedelta(hours=1))
+        self.ingestor.add(first.pk, 80, self.now)
+        self.ingestor.add(second.pk, 50, self.now)
+        self.ingestor.flush()
+        latest = ProductLatestPrice.objects.in_bulk()
+        snapshot = latest[first.pk]
+        self.assertEqual(
+            (snapshot.price, snapshot.last_price, snapshot.discount_rate, snapshot.date), (80, 90, 11.11, self.now),
+        )
+        self.assertEqual((latest[second.pk].price, latest[second.pk].discount_rate), (50, 0))
+
+
+class RollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name='Store', shortname='store', base_url='http://store.test')
+        cls.products = [
+            Product.objects.create(
+                store=store, name=f'P{i}', brand='B', sku=str(i), link=f'http://store.test/{i}', image='',
+            )
+            for i in range(2)
+        ]
+
+    def add(self, product, price, date):
+        return ProductHistory.objects.create(product=product, price=price, last_price=price, date=date)
+
+    def at(self, day, hour):
+        return timezone.make_aware(datetime.datetime(2024, 3, day, hour))
+
+    def bucket(self, model, date):
+        bucket = model.objects.get(product=self.products[0], date=date)
+        return bucket.open, bucket.close, bucket.min, bucket.max, bucket.avg, bucket.count
+
+    def test_merges_new_rows_into_buckets(self):
+        product = self.products[0]
+        self.add(product, 100, self.at(6, 10))
+        last = self.add(product, 80, self.at(6, 12))
+        self.assertEqual(update_rollups(), last.pk)
+        self.assertEqual(
+            self.bucket(ProductPriceDaily, datetime.date(2024, 3, 6)), (100, 80, 80, 100, 90, 2),
+        )
+
+        # Rows written later but dated before and after the merged ones.
+        self.add(product, 120, self.at(6, 9))
+        self.add(product, 90, self.at(6, 15))
+        self.add(product, 70, self.at(8, 10))
+        update_rollups(chunk_size=1)
+        self.assertEqual(
+            self.bucket(ProductPriceDaily, datetime.date(2024, 3, 6)), (120, 90, 80, 120, 97.5, 4),
+        )
+        self.assertEqual(
+            self.bucket(ProductPriceWeekly, datetime.date(2024, 3, 4)), (120, 70, 70, 120, 92, 5),
+        )
+
+    def test_watermark_moves_to_the_horizon(self):
+        self.assertEqual(update_rollups(), 0)
+        rows = [self.add(self.products[0], price, self.at(6, price)) for price in [10, 11, 12]]
+        self.assertEqual(safe_horizon(), rows[-1].pk)
+        update_rollups()
+        self.assertEqual(get_watermark(), rows[-1].pk)
+        self.assertEqual(update_rollups(), 0)
+        self.assertEqual(ProductPriceDaily.objects.get().count, 3)
+
+    def test_compact_keeps_the_newest_row_of_each_product(self):
+        first, second = self.products
+        old = timezone.now() - datetime.timedelta(days=100)
+        rows = [self.add(first, price, old + datetime.timedelta(hours=price)) for price in [1, 2, 3]]
+        single = self.add(second, 5, old)
+        recent = self.add(first, 4, timezone.now())
+        update_rollups()
+        not_rolled_up = self.add(second, 6, old - datetime.timedelta(days=1))
+
+        self.assertEqual(compact_history(30, batch_size=1), 3)
+        self.assertEqual(
+            set(ProductHistory.objects.values_list('pk', flat=True)), {single.pk, recent.pk, not_rolled_up.pk},
+        )
+        self.assertFalse(ProductHistory.objects.filter(pk__in=[row.pk for row in rows]).exists())
+
+
+@override_settings(CRAWL_QUEUE_MAX_ATTEMPTS=2, CRAWL_QUEUE_LEASES_PER_STORE=1)
+class CrawlQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.stores = [
+            Store.objects.create(name=f'Store {i}', shortname=f'store{i}', base_url=f'http://store{i}.test')
+            for i in range(2)
+        ]
+        for store in cls.stores:
+            for i in range(5):
+                Product.objects.create(
+                    store=store, name=f'P{i}', brand='B', sku=str(i), link=f'{store.base_url}/{i}', image='',
+                )
+
+    def expire(self, task):
+        CrawlTask.objects.filter(pk=task.pk).update(leased_until=timezone.now() - datetime.timedelta(seconds=1))
+
+    def test_enqueue_skips_queued_products(self):
+        self.assertEqual(crawl_queue.enqueue(self.stores[:1], task_size=2), 3)
+        tasks = list(CrawlTask.objects.order_by('id'))
+        self.assertEqual([len(task.product_ids) for task in tasks], [2, 2, 1])
+        self.assertEqual(crawl_queue.enqueue(self.stores[:1], all_products=True, task_size=2), 0)
+
+        [task] = crawl_queue.lease('w1')
+        self.assertTrue(crawl_queue.complete(task, 'w1', checked=2))
+        self.assertEqual(crawl_queue.enqueue(self.stores[:1], all_products=True, task_size=2), 1)
+        self.assertEqual(CrawlTask.objects.last().product_ids, task.product_ids)
+
+    def test_one_lease_per_store(self):
+        crawl_queue.enqueue(self.stores, task_size=2)
+        tasks = crawl_queue.lease('w1', count=5)
+        self.assertEqual(sorted(task.store_id for task in tasks), sorted(store.pk for store in self.stores))
+        self.assertEqual(crawl_queue.lease('w2', count=5, per_store=1), [])
+
+        self.assertTrue(crawl_queue.complete(tasks[0], 'w1'))
+        [task] = crawl_queue.lease('w2', count=5, per_store=1)
+        self.assertEqual((task.store_id, task.leased_by, task.attempts), (tasks[0].store_id, 'w2', 1))
+        self.assertEqual(crawl_queue.lease('w3', per_store=1), [])
+
+    def test_expired_lease_is_taken_over(self):
+        crawl_queue.enqueue(self.stores[:1], task_size=5)
+        [task] = crawl_queue.lease('w1')
+        self.assertTrue(crawl_queue.renew(task, 'w1'))
+        self.expire(task)
+        [task] = crawl_queue.lease('w2')
+        self.assertEqual((task.leased_by, task.attempts), ('w2', 2))
+        self.assertFalse(crawl_queue.renew(task, 'w1'))
+        self.assertFalse(crawl_queue.complete(task, 'w1'))
+        self.assertTrue(crawl_queue.complete(task, 'w2', checked=5))
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.checked), (CrawlTask.DONE, 5))
+
+    def test_expired_lease_fails_after_max_attempts(self):
+        crawl_queue.enqueue(self.stores[:1], task_size=5)
+        for worker in ['w1', 'w2']:
+            [task] = crawl_queue.lease(worker)
+            self.expire(task)
+        self.assertEqual(crawl_queue.lease('w3'), [])
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.last_error), (CrawlTask.FAILED, 'Lease expired'))
+
+    def test_release(self):
+        crawl_queue.enqueue(self.stores[:1], task_size=5)
+        [task] = crawl_queue.lease('w1')
+        self.assertFalse(crawl_queue.release(task, 'w2', 'Not mine'))
+        self.assertTrue(crawl_queue.release(task, 'w1', 'Timeout'))
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.last_error, task.leased_until), (CrawlTask.PENDING, 'Timeout', None))
+
+        [task] = crawl_queue.lease('w1')
+        self.assertTrue(crawl_queue.release(task, 'w1', 'Timeout'))
+        task.refresh_from_db()
+        self.assertEqual(task.status, CrawlTask.FAILED)
+        self.assertIsNotNone(task.finished_at)
+
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">
+  <channel>
+    <title>Store</title>
+    <item>
+      <g:id>A-1</g:id>
+      <g:title>Televisor 55</g:title>
+      <g:brand>Samsung</g:brand>
+      <g:mpn>QN55</g:mpn>
+      <link>http://store.test/rss-link</link>
+      <g:link>http://store.test/a-1</g:link>
+      <g:image_link>http://store.test/a-1.jpg</g:image_link>
+      <g:product_type>TV &gt; Smart TV</g:product_type>
+      <g:price>1.299,00 CLP</g:price>
+      <g:sale_price>{price}</g:sale_price>
+    </item>
+    <item>
+      <g:id>B-2</g:id>
+      <g:title>Audifonos</g:title>
+      <g:link>http://store.test/b-2</g:link>
+      <g:price>19990 CLP</g:price>
+    </item>
+    <item>
+      <g:title>Sin id</g:title>
+    </item>
+  </channel>
+</rss>
+"""
+
+
+class DiscoveryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = Store.objects.create(name='Store', shortname='store', base_url='http://store.test')
+
+    def discover(self, price):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feed.xml.gz')
+            with gzip.open(path, 'wt', encoding='utf-8') as feed:
+                feed.write(FEED.format(price=price))
+            return Discovery(self.store, batch_size=1).run([path])
+
+    def test_gzipped_feed(self):
+        stats = self.discover('999,00')
+        self.assertEqual(
+            (stats.sources, stats.entries, stats.skipped, stats.upserted, stats.created, stats.prices),
+            (1, 3, 1, 2, 2, 2),
+        )
+        product = Product.objects.get(store=self.store, sku='A-1')
+        self.assertEqual((product.name, product.brand, product.model), ('Televisor 55', 'Samsung', 'QN55'))
+        self.assertEqual((product.link, product.image), ('http://store.test/a-1', 'http://store.test/a-1.jpg'))
+        self.assertEqual(product.categories, ['TV', 'Smart TV'])
+        self.assertEqual(product.match_key, 'samsung:qn55')
+        self.assertIsNone(product.next_check_at)
+        prices = dict(ProductHistory.objects.values_list('product__sku', 'price'))
+        self.assertEqual(prices, {'A-1': 999.0, 'B-2': 19990.0})
+
+        stats = self.discover('899,00')
+        self.assertEqual((stats.upserted, stats.created, stats.prices), (2, 0, 1))
+        self.assertEqual(Product.objects.filter(store=self.store).count(), 2)
+        self.assertEqual(ProductLatestPrice.objects.get(product=product).price, 899.0)
+
+
+class StubStoreHandler(BaseHTTPRequestHandler):
+    """
+    `/p/<price>` pages with an ETag, `/boom` breaks the extractor, `/error`
+    answers a 500 and `/empty` has no price.
+    """
+
+    def do_GET(self):
+        if self.path.startswith('/p/'):
+            etag = f'"{self.path}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            price = self.path[3:]
+            body = f'<script type="application/ld+json">{{"offers": {{"price": "{price}"}}}}</script>'
+            self.send_page(body, ETag=etag)
+        elif self.path == '/boom':
+            self.send_page('boom')
+        elif self.path == '/empty':
+            self.send_page('<html></html>')
+        else:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def send_page(self, body, **headers):
+        body = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubExtractor(Extractor):
+    parsed = 0
+
+    def extract(self, html):
+        StubExtractor.parsed += 1
+        if 'boom' in html:
+            raise ValueError('Malformed page')
+        return super().extract(html)
+
+
+class CrawlerTests(TransactionTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubStoreHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        register('stub')(StubExtractor)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        EXTRACTORS.pop('stub')
+        close_pool()
+        super().tearDownClass()
+
+    def setUp(self):
+        base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.store = Store.objects.create(name='Stub', shortname='stub', base_url=base_url)
+        self.products = {
+            path: Product.objects.create(
+                store=self.store, name=path, brand='B', sku=path, link=f'{base_url}{path}', image='',
+            )
+            for path in ['/p/100', '/p/200', '/boom', '/error', '/empty']
+        }
+        StubExtractor.parsed = 0
+
+    def tearDown(self):
+        # The crawler reaches the database from the thread of sync_to_async().
+        asyncio.run(sync_to_async(connections.close_all)())
+
+    def crawl(self):
+        crawler = Crawler(parse_workers=0, all_products=True)
+        crawler.run([self.store])
+        return crawler
+
+    def ids(self, *paths):
+        return {self.products[path].pk for path in paths}
+
+    def test_counts(self):
+        crawler = self.crawl()
+        self.assertEqual(crawler.stats.fetched, 4)
+        self.assertEqual(crawler.stats.failed, 1)
+        self.assertEqual(crawler.stats.unparsed, 2)
+        self.assertEqual(crawler.stats.not_modified, 0)
+        prices = dict(ProductHistory.objects.values_list('product__sku', 'price'))
+        self.assertEqual(prices, {'/p/100': 100.0, '/p/200': 200.0})
+        self.assertEqual(crawler.checked, self.ids('/p/100', '/p/200'))
+        self.assertEqual(crawler.failed, self.ids('/boom', '/error', '/empty'))
+
+    def test_parse_error_does_not_abort_the_run(self):
+        crawler = self.crawl()
+        self.assertEqual(StubExtractor.parsed, 4)
+        self.assertEqual(ProductHistory.objects.count(), 2)
+        stats = self.store.crawl_stats.select_related('run').get()
+        self.assertEqual(stats.parse_failures, 2)
+        self.assertEqual(stats.run.status, CrawlRun.FINISHED)
+        self.assertEqual(crawler.stats.written, 2)
+
+    def test_not_modified_skips_the_parse(self):
+        self.crawl()
+        product = Product.objects.get(pk=self.products['/p/100'].pk)
+        self.assertEqual(product.http_etag, '"/p/100"')
+
+        StubExtractor.parsed = 0
+        crawler = self.crawl()
+        self.assertEqual(crawler.stats.not_modified, 2)
+        self.assertEqual(StubExtractor.parsed, 2)
+        self.assertEqual(ProductHistory.objects.count(), 2)
+        self.assertEqual(crawler.checked, self.ids('/p/100', '/p/200'))
+
+    def test_failed_products_keep_their_interval(self):
+        before = timezone.now()
+        self.crawl()
+        products = Product.objects.in_bulk()
+        for path in ['/boom', '/error', '/empty']:
+            product = products[self.products[path].pk]
+            self.assertEqual(product.check_interval, 60 * 60)
+            self.assertGreaterEqual(product.next_check_at, before + datetime.timedelta(hours=1))
+            self.assertLess(product.next_check_at, timezone.now() + datetime.timedelta(hours=1))
+
+
+class EvaluateAlertsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name='Store', shortname='store', base_url='http://store.test')
+        cls.user = get_user_model().objects.create_user('user', 'user@example.com', 'password')
+        cls.product = Product.objects.create(
+            store=store, name='P', brand='B', sku='1', link='http://store.test/1', image='',
+        )
+
+    def set_price(self, price):
+        ProductLatestPrice.objects.update_or_create(
+            product=self.product, defaults={'price': price, 'last_price': price, 'date': timezone.now()},
+        )
+        return evaluate_alerts([self.product.pk])
+
+    def test_target_price(self):
+        watch = Watch.objects.create(user=self.user, product=self.product, target_price=95, reference_price=100)
+        self.assertEqual(self.set_price(100), [])
+        [alert] = self.set_price(95)
+        self.assertEqual((alert.watch_id, alert.price, alert.previous_price), (watch.pk, 95, 100))
+        watch.refresh_from_db()
+        self.assertEqual(watch.notified_price, 95)
+
+        # Not notified again at the same or a higher price.
+        self.assertEqual(self.set_price(95), [])
+        self.assertEqual(self.set_price(96), [])
+        [alert] = self.set_price(90)
+        self.assertEqual((alert.price, alert.previous_price), (90, 95))
+
+    def test_drop_rate(self):
+        Watch.objects.create(user=self.user, product=self.product, drop_rate=10, reference_price=100)
+        self.assertEqual(self.set_price(91), [])
+        [alert] = self.set_price(90)
+        self.assertEqual((alert.price, alert.previous_price), (90, 100))
+        self.assertEqual(self.set_price(90), [])
+
+    def test_reference_price_from_first_price(self):
+        watch = Watch.objects.create(user=self.user, product=self.product, drop_rate=10)
+        self.assertEqual(self.set_price(100), [])
+        watch.refresh_from_db()
+        self.assertEqual(watch.reference_price, 100)
+        self.assertEqual(self.set_price(95), [])
+        [alert] = self.set_price(85)
+        self.assertEqual((alert.price, alert.previous_price), (85, 100))
+        self.assertEqual(PriceAlert.objects.count(), 1)
+
+
+class AlertDigestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name='Store', shortname='store', base_url='http://store.test')
+        cls.user = get_user_model().objects.create_user('user', 'user@example.com', 'password')
+        cls.products = []
+        for i in range(2):
+            product = Product.objects.create(
+                store=store, name=f'P{i}', brand='B', sku=str(i), link=f'http://store.test/{i}', image='',
+            )
+            ProductLatestPrice.objects.create(product=product, price=90, last_price=100, date=timezone.now())
+            cls.products.append(product)
+        cls.watch = Watch.objects.create(user=cls.user, product=cls.products[0], target_price=95)
+
+    def alert(self, product, price, created_at):
+        alert = PriceAlert.objects.create(watch=self.watch, user=self.user, product=product, price=price)
+        PriceAlert.objects.filter(pk=alert.pk).update(created_at=created_at)
+        return alert
+
+    def test_one_email_per_user_with_the_latest_alert_of_each_product(self):
+        now = timezone.now()
+        window_end = window_start(now, 60)
+        old = self.alert(self.products[0], 94, window_end - datetime.timedelta(minutes=30))
+        latest = self.alert(self.products[0], 90, window_end - datetime.timedelta(minutes=10))
+        other = self.alert(self.products[1], 90, window_end - datetime.timedelta(minutes=10))
+        pending = self.alert(self.products[0], 80, window_end + datetime.timedelta(seconds=1))
+
+        self.assertEqual(queue_alert_digests(60, now), 1)
+        email = QueuedEmail.objects.get()
+        self.assertEqual(email.to_email, 'user@example.com')
+        self.assertEqual(email.body.count('P0'), 1)
+        self.assertIn('P1', email.body)
+        sent = set(PriceAlert.objects.filter(sent_at__isnull=False).values_list('pk', flat=True))
+        self.assertEqual(sent, {old.pk, latest.pk, other.pk})
+        self.assertNotIn(pending.pk, sent)
+        self.assertEqual(queue_alert_digests(60, now), 0)
+
+
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name='Store', shortname='store', base_url='http://store.test')
+        cls.product = Product.objects.create(
+            store=store, name='P', brand='B', sku='1', link='http://store.test/1', image='',
+        )
+        ProductHistory.objects.create(product=cls.product, price=100, last_price=100, date=timezone.now())
+        ProductLatestPrice.objects.create(product=cls.product, price=100, last_price=100, date=timezone.now())
+
+    def test_product_endpoints_return_304(self):
+        for name in ['api_product', 'api_history']:
+            url = reverse(f'product:{name}', args=[self.product.pk])
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.has_header('ETag'))
+            self.assertTrue(response.has_header('Last-Modified'))
+            response = self.client.get(url, headers={'if-none-match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+    def test_malformed_since_and_cursor_are_bad_requests(self):
+        history = reverse('product:api_history', args=[self.product.pk])
+        self.assertEqual(self.client.get(history, {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(history, {'cursor': 'tampered'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('product:api_products'), {'cursor': 'tampered'}).status_code, 400)
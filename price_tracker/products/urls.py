@@ -1,9 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+
+# Async versions of the read views for the ASGI deployment.
+pages = async_views if settings.ASYNC_VIEWS else views
+export = async_views if settings.ASYNC_VIEWS else api
 
 
 app_name = 'product'
 urlpatterns = [
-    path("", views.home, name="home"),
-    path("<int:pk>", views.product_details, name="product"),
+    path("", pages.home, name="home"),
+    path("search/", pages.search, name="search"),
+    path("<int:pk>", pages.product_details, name="product"),
+    path("<int:pk>/compare/", views.product_compare, name="compare"),
+    path("<int:pk>/stats/", views.product_stats, name="stats"),
+    path("store/<str:shortname>/stats/", views.store_stats, name="store_stats"),
+    path("<int:pk>/watch/", views.watch_create, name="watch"),
+    path("<int:pk>/unwatch/", views.watch_delete, name="unwatch"),
+    path("watchlist/", views.watchlist, name="watchlist"),
+    # api
+    path("api/stores/", api.store_list, name="api_stores"),
+    path("api/stores/<str:shortname>/", api.store_detail, name="api_store"),
+    path("api/products/", api.product_list, name="api_products"),
+    path("api/products/<int:pk>/", api.product_detail, name="api_product"),
+    path("api/products/<int:pk>/history/", api.product_history, name="api_history"),
+    path("api/export/history.<str:format>", export.history_export, name="api_export"),
+    path("api/crawl/metrics/", api.crawl_metrics, name="api_crawl_metrics"),
 ]
\ No newline at end of file
@@ -1,10 +1,186 @@
-from django.shortcuts import render
+import datetime
 
-# Create your views here.
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.decorators import login_required
+from django.db.models import F, Subquery
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
+from django.views.decorators.http import condition, require_POST
+
+from core.cache import cache_view
+from core.routers import use_primary
+
+from .alerts import evaluate_alerts
+from .cache import catalog_versions, product_etag, product_last_modified, product_versions, set_card_versions
+from .analytics import product_analytics, store_analytics
+from .catalog import InvalidCursor, filter_products, get_page_size, keyset_page, search_products
+from .forms import WatchForm
+from .history import price_series
+from .models import Product, Store, Watch
+
+
+STORE_STATS_PAGE_SIZE = 500
+
+
+@cache_view(catalog_versions)
 def home(request):
-    pass
+    products = filter_products(request.GET)
+    try:
+        products, next_cursor = keyset_page(
+            products,
+            sort=request.GET.get('sort'),
+            cursor=request.GET.get('cursor'),
+            size=get_page_size(request.GET),
+        )
+    except InvalidCursor:
+        raise Http404('Invalid cursor')
+
+    context = {
+        'products': set_card_versions(products),
+        'stores': Store.objects.filter(enabled=True).order_by('name'),
+        'next_query': get_next_query(request, next_cursor),
+    }
+    return render(request, 'products/home.html', context)
+
 
+def get_next_query(request, next_cursor):
+    if not next_cursor:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = next_cursor
+    return query.urlencode()
 
 
+@cache_view(catalog_versions)
+def search(request):
+    query = request.GET.get('q', '')
+    products = search_products(filter_products(request.GET), query, size=get_page_size(request.GET))
+    context = {
+        'products': set_card_versions(products),
+        'stores': Store.objects.filter(enabled=True).order_by('name'),
+        'query': query,
+    }
+    return render(request, 'products/home.html', context)
+
+
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
+@cache_view(product_versions)
 def product_details(request, pk):
-    pass
\ No newline at end of file
+    product = get_object_or_404(Product.objects.select_related('store', 'latest_price'), pk=pk)
+    context = {
+        'product': product,
+        'history': price_series(product, **get_series_options(request)),
+        'watch_form': WatchForm(),
+    }
+    return render(request, 'products/product_details.html', context)
+
+
+def get_series_options(request):
+    since = None
+    days = request.GET.get('days')
+    if days and days.isdigit():
+        since = timezone.now() - datetime.timedelta(days=int(days))
+    method = 'lttb' if request.GET.get('downsample') == 'lttb' else 'bucket'
+    return {'since': since, 'method': method}
+
+
+def offer_data(product):
+    latest = getattr(product, 'latest_price', None)
+    return {
+        'id': product.pk,
+        'store': product.store.name,
+        'name': product.name,
+        'link': product.link,
+        'price': latest and latest.price,
+        'last_price': latest and latest.last_price,
+        'discount_rate': latest and latest.discount_rate,
+        'date': latest and latest.date,
+    }
+
+
+def product_compare(request, pk):
+    match_key = Product.objects.filter(pk=pk).exclude(match_key='').values('match_key')[:1]
+    offers = (
+        Product.objects.filter(match_key=Subquery(match_key), store__enabled=True)
+        .select_related('store', 'latest_price')
+        .order_by(F('latest_price__price').asc(nulls_last=True), 'pk')
+    )
+    offers = [offer_data(offer) for offer in offers]
+    if not offers:
+        get_object_or_404(Product, pk=pk)
+    return JsonResponse({'product': pk, 'offers': offers})
+
+
+def get_days(request, default=30):
+    days = request.GET.get('days', '')
+    return int(days) if days.isdigit() and int(days) > 0 else default
+
+
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
+@use_primary()  # the ETag pins the response, it must include the last writes
+def product_stats(request, pk):
+    product = get_object_or_404(Product.objects.only('pk'), pk=pk)
+    return JsonResponse({'product': pk, 'stats': product_analytics(product, days=get_days(request))})
+
+
+@staff_member_required
+def store_stats(request, shortname):
+    """
+    Statistics of the products of a store, `STORE_STATS_PAGE_SIZE` products
+    per page; `next` is the `?after=` of the next page.
+    """
+    store = get_object_or_404(Store, shortname=shortname, enabled=True)
+    after = request.GET.get('after', '')
+    product_ids = list(
+        Product.objects.filter(store=store, pk__gt=int(after) if after.isdigit() else 0)
+        .order_by('pk').values_list('pk', flat=True)[:STORE_STATS_PAGE_SIZE]
+    )
+    return JsonResponse({
+        'store': store.shortname,
+        'products': store_analytics(product_ids, days=get_days(request)),
+        'next': product_ids[-1] if len(product_ids) == STORE_STATS_PAGE_SIZE else None,
+    })
+
+
+# watchlist
+@login_required
+def watchlist(request):
+    watches = (
+        Watch.objects.filter(user=request.user)
+        .select_related('product__store', 'product__latest_price')
+        .order_by('-created_at')
+    )
+    return render(request, 'products/watchlist.html', {'watches': watches})
+
+
+@login_required
+@require_POST
+def watch_create(request, pk):
+    product = get_object_or_404(Product.objects.select_related('latest_price'), pk=pk)
+    form = WatchForm(request.POST, instance=Watch.objects.filter(user=request.user, product=product).first())
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return redirect('product:product', pk)
+
+    watch = form.save(commit=False)
+    latest = getattr(product, 'latest_price', None)
+    watch.user = request.user
+    watch.product = product
+    watch.reference_price = latest and latest.price
+    watch.notified_price = None
+    watch.save()
+    evaluate_alerts([product.pk])
+    messages.success(request, '¡Te avisaremos cuando baje el precio!')
+    return redirect('product:product', pk)
+
+
+@login_required
+@require_POST
+def watch_delete(request, pk):
+    Watch.objects.filter(user=request.user, product_id=pk).delete()
+    messages.success(request, 'Producto eliminado de tu lista.')
+    return redirect('product:watchlist')